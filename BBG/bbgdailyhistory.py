@@ -1,102 +1,236 @@
 # *- bbgdailyhistory.py -*
 
 import os
+import threading
 import numpy as np
 import pandas as pd
 import blpapi
 
 
+# Long-lived session shared by every BBGDailyHistory of the process. Requests
+# on it are serialized, one request/response exchange at a time
+_session = None
+_service = None
+_lock = threading.RLock()
+
+
+def get_session():
+    '''
+    Started blpapi session with //blp/refdata open, created on first use
+
+    Returns
+    -------
+    (session, service) : tuple
+    '''
+    global _session, _service
+    with _lock:
+        if _session is None:
+            sess = blpapi.Session()
+            sess.start()
+            sess.openService('//blp/refdata')
+            _service = sess.getService('//blp/refdata')
+            _session = sess
+        return _session, _service
+
+
+def stop_session():
+    '''
+    Stop the shared session, the next request starts a new one
+    '''
+    global _session, _service
+    with _lock:
+        if _session is not None:
+            _session.stop()
+            _session = None
+            _service = None
+
+
 class BBGDailyHistory:
     '''
     Parameters
     ----------
-    sec : str
-        Ticker
+    sec : str or list
+        Ticker or list of tickers, all requested at once
     fields : str or list
         Field of list of fields ('PX_HIGH', 'PX_LOW', etc...)
     start : str
         Start date
     end : str
-        End date
+        End date (today if None)
+    session : tuple or None
+        (session, service) to send the request on, the shared get_session() if None
     '''
-    
-    def __init__(self, sec, fields, start=None, end=None):
+
+    def __init__(self, sec, fields, start=None, end=None, session=None):
         #self.rqst = rqst
         self.sec = sec
         self.fields = fields
         self.start = start
         self.end = end
+        self.session = session
 
-    
-    def get_data(self) -> pd.DataFrame:
+    @property
+    def securities(self):
+        return [self.sec] if isinstance(self.sec, str) else list(self.sec)
+
+    @property
+    def field_list(self):
+        return [self.fields] if isinstance(self.fields, str) else list(self.fields)
+
+    def get_data(self, long=False, events=None) -> pd.DataFrame:
         '''
+        Parameters
+        ----------
+        long : bool
+            Return the long view (timestamp, ticker, field, value) instead of the wide frame
+        events : iterable or None
+            blpapi-like events to parse instead of sending a request (e.g. a mock
+            event source); consumed up to and including the RESPONSE event
+
         Returns
         -------
         data : pd.DataFrame()
-            The historical data queried returned in a dataFrame presented as
-            long format
+            Wide frame indexed by timestamp with (ticker, field) columns, or the
+            long format with long=True
         '''
-        # Session management
-        sess = blpapi.Session()
-        sess.start()
-
-        # Define data type
-        sess.openService('//blp/refdata')
-        service = sess.getService('//blp/refdata')
-
-        # Create request
-        request = service.createRequest('HistoricalDataRequest')
-
-        # Optional request setters
-        request.set('startDate', self.start)
-        request.set('endDate', self.end)
-        request.getElement('securities').appendValue(self.sec)
-
-        # Data holders 
-        date_acc =[]
-        ticker_acc = []
-        field_acc = []
-        value_acc = []
-
-        # Loop over fields
-        for fie in self.fields:
-            request.getElement('fields').appendValue(fie)
-        sess.sendRequest(request)
-        endReached = False
-        while endReached == False:
+        if events is None:
+            with _lock:
+                sess, service = self.session or get_session()
+
+                # Create request
+                request = service.createRequest('HistoricalDataRequest')
+
+                # Optional request setters
+                request.set('startDate', self.start)
+                if self.end is not None:
+                    request.set('endDate', self.end)
+                for sec in self.securities:
+                    request.getElement('securities').appendValue(sec)
+                for fie in self.field_list:
+                    request.getElement('fields').appendValue(fie)
+
+                sess.sendRequest(request)
+                wide = self._collect(self._responseEvents(sess))
+        else:
+            wide = self._collect(events)
+
+        return self.to_long(wide) if long else wide
+
+    @staticmethod
+    def _responseEvents(sess):
+        # Events of the pending request, up to and including the final RESPONSE
+        while True:
             event = sess.nextEvent(500)
-            if event.eventType() == blpapi.Event.RESPONSE or event.eventType() == blpapi.Event.PARTIAL_RESPONSE:
-                for msg in event:
-                    fieldData = msg.getElement('securityData').getElement('fieldData')
-                    for data in fieldData.values():
-                        for fld in self.fields:
-                            date_acc.append(data.getElement('date').getValue())
-                            field_acc.append(fld)
-                            value_acc.append(data.getElement(fld).getValue())
-                            ticker_acc.append(self.sec)
-                
+            yield event
             if event.eventType() == blpapi.Event.RESPONSE:
-                endReached = True
-        
-        sess.stop()
+                return
+
+    def _collect(self, events):
+        # Values go into one (n_days, n_secs) array per field, row = days since
+        # 'start', written once per message. Arrays start float64 and switch to
+        # object on the first non-numeric value (e.g. FUT_CUR_GEN_TICKER)
+        secs = self.securities
+        fields = self.field_list
+        sec_pos = {sec : i for i, sec in enumerate(secs)}
+        day0 = pd.Timestamp(self.start).date()
+        end = pd.Timestamp(self.end).date() if self.end is not None else pd.Timestamp.today().date()
+        n_days = max((end - day0).days + 1, 1)
+
+        values = {fld : np.full((n_days, len(secs)), np.nan) for fld in fields}
+        seen = np.zeros(n_days, dtype=bool)
 
-        data = pd.DataFrame({'timestamp' : date_acc,
-                            'ticker' : ticker_acc,
-                            'field' : field_acc,
-                            'value' : value_acc})
+        for event in events:
+            etype = event.eventType()
+            if etype not in (blpapi.Event.RESPONSE, blpapi.Event.PARTIAL_RESPONSE):
+                continue
+            for msg in event:
+                secData = msg.getElement('securityData')
+                if secData.hasElement('securityError'):
+                    continue
+                col = sec_pos.get(secData.getElement('security').getValue(), 0 if len(secs) == 1 else None)
+                if col is None:
+                    continue
+
+                # Buffer the message, then one vectorized write per field
+                rows = []
+                buf = {fld : ([], []) for fld in fields}
+                for data in secData.getElement('fieldData').values():
+                    row = (data.getElement('date').getValue() - day0).days
+                    if row < 0:
+                        continue
+                    rows.append(row)
+                    for fld in fields:
+                        if data.hasElement(fld):
+                            buf[fld][0].append(row)
+                            buf[fld][1].append(data.getElement(fld).getValue())
+                if not rows:
+                    continue
+
+                if max(rows) >= n_days:
+                    # Past the expected end: grow every array
+                    grow = max(max(rows) + 1, 2 * n_days) - n_days
+                    for fld, arr in values.items():
+                        values[fld] = np.concatenate([arr, np.full((grow, len(secs)), np.nan, dtype=arr.dtype)])
+                    seen = np.concatenate([seen, np.zeros(grow, dtype=bool)])
+                    n_days += grow
+                seen[rows] = True
+
+                for fld, (fld_rows, vals) in buf.items():
+                    if not fld_rows:
+                        continue
+                    arr = values[fld]
+                    if arr.dtype != object:
+                        try:
+                            vals = np.asarray(vals, dtype=float)
+                        except (TypeError, ValueError):
+                            arr = values[fld] = arr.astype(object)
+                    arr[fld_rows, col] = vals
+            if etype == blpapi.Event.RESPONSE:
+                break
+
+        rows = np.flatnonzero(seen)
+        index = pd.DatetimeIndex(np.datetime64(day0, 'D') + rows, name='timestamp')
+        columns = pd.MultiIndex.from_product([secs, fields], names=['ticker', 'field'])
+        if not len(rows):
+            return pd.DataFrame(index=index, columns=columns, dtype=float)
+        data = {(sec, fld) : values[fld][rows, j] for j, sec in enumerate(secs) for fld in fields}
+        return pd.DataFrame(data, index=index, columns=columns)
+
+    @staticmethod
+    def to_long(wide) -> pd.DataFrame:
+        '''
+        Long view of a get_data() wide frame: one row per timestamp, ticker and field
+        with a value, sorted by timestamp, ticker, then field in request order
+        '''
+        rows, cols, vals = [], [], []
+        for k in range(wide.shape[1]):
+            col = wide.iloc[:, k].to_numpy()
+            ok = np.flatnonzero(~pd.isnull(col))
+            rows.append(ok)
+            cols.append(np.full(len(ok), k))
+            vals.append(col[ok])
 
-        return data
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+        vals = np.concatenate(vals) if vals else np.empty(0)
+        order = np.lexsort((cols, rows))
+        rows, cols = rows[order], cols[order]
 
+        return pd.DataFrame({'timestamp' : wide.index[rows],
+                             'ticker' : wide.columns.get_level_values('ticker')[cols],
+                             'field' : wide.columns.get_level_values('field')[cols],
+                             'value' : vals[order]})
 
 '''
 # Example
 if __name__ == "__main__":
     # Use example of BBGHistory
     #from bbgdatapuller import BBGHistory # Expect folder issue
-    security = 'SIMA SW Equity' #'SIMA SW Equity'
+    securities = ['SIMA SW Equity', 'NESN SW Equity']
     fields = ['PX_OPEN', 'PX_HIGH', 'PX_LOW', 'PX_LAST']
     start = '20200105'
     end = '20200109'
-    d = BBGDailyHistory(sec=security, fields=fields, start=start, end=end).get_data()
+    d = BBGDailyHistory(sec=securities, fields=fields, start=start, end=end).get_data()
     print(d.head())
+    print(BBGDailyHistory.to_long(d).head())
 '''
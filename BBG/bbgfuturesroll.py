@@ -2,8 +2,10 @@
 # tagomatech Oct25
 
 from __future__ import annotations
-from typing import Sequence, Mapping, Optional, Union, Literal
+from typing import Any, Sequence, Mapping, Optional, Union, Literal
 from datetime import date, datetime
+import threading
+import numpy as np
 import pandas as pd
 from blp import blp
 
@@ -13,6 +15,29 @@ def _to_bbg_date(d: Union[str, date, datetime]) -> str:
         raise ValueError(f"Invalid date: {d!r}")
     return ts.strftime("%Y%m%d")  # Bloomberg BDH expects YYYYMMDD
 
+# --- pooled session: one started BlpQuery per process, shared by every call
+_query: Optional[Any] = None
+_query_lock = threading.Lock()
+
+def get_bbg_query(**kwargs) -> Any:
+    """
+    Started blp.BlpQuery shared across calls (created and started on first use).
+    kwargs go to blp.BlpQuery on that first call only.
+    """
+    global _query
+    with _query_lock:
+        if _query is None:
+            _query = blp.BlpQuery(**kwargs).start()
+        return _query
+
+def close_bbg_query() -> None:
+    """Stop the pooled session; the next call starts a new one."""
+    global _query
+    with _query_lock:
+        if _query is not None:
+            _query.stop()
+            _query = None
+
 def get_rolled_bbg_data(
     start_date: Union[str, date, datetime],
     end_date: Union[str, date, datetime],
@@ -22,6 +47,7 @@ def get_rolled_bbg_data(
     roll_type: Literal["backward", "forward"] = "backward",
     close_field: str = "PX_LAST",
     field_rename_map: Optional[Mapping[str, str]] = None,
+    query: Optional[Any] = None,
 ) -> pd.DataFrame:
     """
     Build a continuous, roll-adjusted series from Bloomberg futures.
@@ -29,8 +55,36 @@ def get_rolled_bbg_data(
     roll_type:
       - "backward"  -> anchor to the most recent contract (adjust older history UP)
       - "forward"   -> anchor to the first contract (adjust newer history DOWN)
+
+    query: object with a blp-style bdh(); defaults to the pooled session (get_bbg_query).
+    """
+    return get_rolled_bbg_data_many(
+        start_date, end_date, [ticker], fields,
+        roll_type=roll_type, close_field=close_field,
+        field_rename_map=field_rename_map, query=query,
+    )
+
+def get_rolled_bbg_data_many(
+    start_date: Union[str, date, datetime],
+    end_date: Union[str, date, datetime],
+    tickers: Union[str, Sequence[str]],
+    fields: Union[str, Sequence[str]],
+    *,
+    roll_type: Literal["backward", "forward"] = "backward",
+    close_field: str = "PX_LAST",
+    field_rename_map: Optional[Mapping[str, str]] = None,
+    query: Optional[Any] = None,
+) -> pd.DataFrame:
+    """
+    get_rolled_bbg_data for many generic tickers in one bdh request.
+
+    The combined response is roll-adjusted per ticker in one grouped pass and
+    returned long, sorted by (security, date); Contract_ID restarts at 1 for every
+    ticker, so each ticker's rows equal what get_rolled_bbg_data returns for it.
+    Tickers Bloomberg returns nothing for are absent from the output.
     """
     # --- inputs & required fields
+    tickers = [tickers] if isinstance(tickers, str) else list(dict.fromkeys(tickers))
     if isinstance(fields, str):
         fields = [fields]
     else:
@@ -53,10 +107,10 @@ def get_rolled_bbg_data(
     start_s = _to_bbg_date(start_date)
     end_s = _to_bbg_date(end_date)
 
-    # --- fetch
-    bquery = blp.BlpQuery().start()
+    # --- fetch: every ticker in one request on the pooled session
+    bquery = query if query is not None else get_bbg_query()
     df = bquery.bdh(
-        ticker,
+        tickers,
         fields=request_fields,
         start_date=start_s,
         end_date=end_s,
@@ -67,9 +121,13 @@ def get_rolled_bbg_data(
     # --- clean / standardize
     if "date" not in df.columns:
         raise KeyError("Expected 'date' in BDH output.")
+    if "security" not in df.columns:
+        if len(tickers) > 1:
+            raise KeyError("Expected 'security' in multi-ticker BDH output.")
+        df = df.assign(security=tickers[0])
 
     df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df = df.dropna(subset=["date"]).sort_values("date").reset_index(drop=True)
+    df = df.dropna(subset=["date"]).sort_values(["security", "date"], kind="stable").reset_index(drop=True)
 
     # rename to Open/High/Low/Last/Ticker
     present_map = {k: v for k, v in field_rename_map.items() if k in df.columns}
@@ -88,25 +146,38 @@ def get_rolled_bbg_data(
     # need Ticker + Last for adjustment math
     df = df.dropna(subset=["Ticker", "Last"]).reset_index(drop=True)
 
-    # --- contract segmentation
-    df["Contract_ID"] = df["Ticker"].ne(df["Ticker"].shift()).cumsum()
-
-    # --- roll gaps (next first - current last) measured on 'Last'
-    grp = df.groupby("Contract_ID", sort=True)["Last"]
-    last_per = grp.last()
-    first_next = grp.first().shift(-1)
-    gaps = (first_next - last_per).fillna(0.0)  # index: Contract_ID, len = N
-
-    # Backward (anchor to last): sum of *future* gaps from i..end
-    backward_adj = gaps.iloc[::-1].cumsum().iloc[::-1]
-
-    # Forward (anchor to first): negative sum of *past* gaps up to i-1
-    forward_adj = -(gaps.cumsum().shift(1).fillna(0.0))
+    # --- contract segmentation: a new segment whenever security or Ticker changes
+    sec = df["security"].to_numpy()
+    tkr = df["Ticker"].to_numpy()
+    new_seg = np.ones(len(df), dtype=bool)
+    new_sec = np.ones(len(df), dtype=bool)
+    new_sec[1:] = sec[1:] != sec[:-1]
+    new_seg[1:] = new_sec[1:] | (tkr[1:] != tkr[:-1])
+    seg = np.cumsum(new_seg) - 1                               # global segment id per row
+    sec_first_seg = seg[new_sec]                               # first segment of every security
+    df["Contract_ID"] = seg - np.repeat(sec_first_seg, np.diff(np.r_[np.flatnonzero(new_sec), len(df)])) + 1
+
+    # --- roll gaps (next first - current last) measured on 'Last', within each security
+    last_px = df["Last"].to_numpy()
+    starts = np.flatnonzero(new_seg)
+    ends = np.r_[starts[1:], len(df)] - 1
+    seg_sec = sec[starts]
+    gaps = np.zeros(len(starts))
+    same = seg_sec[1:] == seg_sec[:-1]
+    gaps[:-1] = np.where(same, last_px[starts[1:]] - last_px[ends[:-1]], 0.0)
+    gaps = pd.Series(gaps)
+    by_sec = pd.Series(seg_sec)
+
+    if roll_type == "backward":
+        # Backward (anchor to last): sum of *future* gaps from i..end
+        adj = gaps.iloc[::-1].groupby(by_sec.iloc[::-1], sort=False).cumsum().iloc[::-1]
+    else:
+        # Forward (anchor to first): negative sum of *past* gaps up to i-1
+        adj = -(gaps.groupby(by_sec, sort=False).cumsum().groupby(by_sec, sort=False).shift(1).fillna(0.0))
 
-    adj_by_contract = backward_adj if roll_type == "backward" else forward_adj
-    df["Roll_Adjustment"] = df["Contract_ID"].map(adj_by_contract).astype(float)
+    df["Roll_Adjustment"] = adj.to_numpy(dtype=float)[seg]
 
-    # adjusted = raw + adjustment  (map encodes direction)
+    # adjusted = raw + adjustment  (adjustment encodes direction)
     for c in price_cols:
         df[f"{c}_Adj"] = df[c] + df["Roll_Adjustment"]
 
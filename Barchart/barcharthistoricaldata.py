@@ -7,18 +7,44 @@ from __future__ import annotations
 
 import io
 import json
+import logging
+import threading
+import time
 import urllib.parse
-from typing import Literal, Union, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Literal, Union, Any
+import numpy as np
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 
 # --------------------------------------------------------------------------- #
 ROOT = "https://www.barchart.com"
 API_EOD = f"{ROOT}/proxies/timeseries/historical/queryeod.ashx"
 
+log = logging.getLogger(__name__)
+
+_PRICE_COLS = ("open", "high", "low", "close")
+_COUNT_COLS = ("volume", "openInterest")
+_SNIFF_BYTES = 512
+
 class BarchartHistoricalData(requests.Session):
-    def __init__(self, *, ua: str | None = None) -> None:
+    # One instance = one XSRF handshake. Share it between fetch threads:
+    # `pool_maxsize` keep-alive connections are pooled per host.
+    # `on_response`, if given, is called after every history() request with a dict
+    # of metrics: symbol, url, status, bytes, rows, elapsed_s.
+    def __init__(
+        self,
+        *,
+        ua: str | None = None,
+        pool_maxsize: int = 10,
+        on_response: Callable[[dict], None] | None = None,
+    ) -> None:
         super().__init__()
+        self.on_response = on_response
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
         self.headers.update(
             {
                 "User-Agent": ua
@@ -54,6 +80,9 @@ class BarchartHistoricalData(requests.Session):
         backadjust: Literal["true", "false"] = "false",
         daystoexpiration: int | None = 1,
         contractroll: Literal["none", "combined"] = "combined",
+        compact: bool = True,
+        arrow: bool = False,
+        timeout: float = 15,
         **extra_params: Any,
     ) -> Union[pd.DataFrame, list[dict], str]:
         params = {
@@ -85,46 +114,200 @@ class BarchartHistoricalData(requests.Session):
             **self._xsrf_header(),
         }
 
-        resp = self.get(API_EOD, params=params, headers=hdrs, timeout=15)
-        print(f"Calling URL: {resp.url}") # Keep this for debugging
+        t0 = time.perf_counter()
+        resp = self.get(API_EOD, params=params, headers=hdrs, timeout=timeout)
+        log.debug("Calling URL: %s", resp.url)
 
         resp.raise_for_status()
-        body = resp.text.strip()
-        
+        content = resp.content
+
+        # Sniff the payload from its first bytes only; the body is parsed in place
+        head = content[:_SNIFF_BYTES]
+        offset = len(head) - len(head.lstrip())
+        head = head[offset:]
+
         # Check for Barchart's "Error: " response directly in the body
-        if body.startswith("Error:"):
-            raise ValueError(f"Barchart API returned an error for symbol {symbol}: {body}")
+        if head.startswith(b"Error:"):
+            raise ValueError(f"Barchart API returned an error for symbol {symbol}: "
+                             f"{content.decode(errors='replace').strip()}")
 
-        first_line = body.splitlines()[0]
+        first_line = head.split(b"\n", 1)[0]
+        result: Any = None
 
         is_plain_text = resp.headers.get("content-type", "").startswith("text")
-        if is_plain_text or "," in first_line:
+        if not head:
+            result = "" if out == "text" else (pd.DataFrame() if out == "df" else [])
+
+        elif is_plain_text or b"," in first_line:
             if out == "text":
-                return body
+                return content.decode().strip()
 
             cols = (
                 ["symbol", "date", "open", "high", "low", "close", "volume", "openInterest"]
-                if first_line.startswith(symbol)
+                if first_line.startswith(symbol.encode())
                 else ["date", "open", "high", "low", "close", "volume"]
             )
-            
-            df = pd.read_csv(
-                io.StringIO(body),
-                header=None,
-                names=cols,
-                parse_dates=["date"],
-                date_format="%Y-%m-%d"
-            )
-            return df if out == "df" else df.to_dict(orient="records")
+            df = self._read_csv(io.BytesIO(content), cols, compact=compact, arrow=arrow)
+            result = df if out == "df" else df.to_dict(orient="records")
 
-        if body and body[0] in "[{":
-            payload = json.loads(body)
+        elif head[:1] in (b"[", b"{"):
+            body = content.decode().strip()
             if out == "text":
                 return body
-            return pd.DataFrame(payload) if out == "df" else payload
+            payload = json.loads(body)
+            result = pd.DataFrame(payload) if out == "df" else payload
+
+        if result is not None:
+            if self.on_response is not None:
+                self.on_response({
+                    "symbol": symbol,
+                    "url": resp.url,
+                    "status": resp.status_code,
+                    "bytes": len(content),
+                    "rows": len(result),
+                    "elapsed_s": time.perf_counter() - t0,
+                })
+            return result
 
+        body = head.decode(errors="replace")
         preview = body[:60].replace("\n", r"\n")
         raise ValueError(
             f"Unrecognised payload – status {resp.status_code}, "
             f"first bytes: '{preview}'"
         )
+
+    def history_range(
+        self,
+        symbol: str,
+        startDate: str,
+        endDate: str,
+        *,
+        chunk_days: int = 3650,
+        row_cap: int = 5000,
+        max_workers: int = 4,
+        limiter: Any = None,
+        timeout: float = 30,
+        min_days: int = 1,
+        **history_kwargs: Any,
+    ) -> pd.DataFrame:
+        """
+        Long pulls in pieces: [startDate, endDate] is cut into `chunk_days` windows
+        fetched concurrently (`max_workers`, each call paced by `limiter.acquire()`,
+        e.g. a TokenBucket, when given).
+
+        A window returning `row_cap` rows or more is assumed truncated by the server,
+        and one that times out is assumed too heavy: both are halved and refetched,
+        down to `min_days`. The pieces are stitched, de-duplicated and date sorted.
+        Extra keyword arguments go to history() (data, volume, compact, ...).
+        """
+        s_dt = pd.Timestamp(startDate).normalize()
+        e_dt = pd.Timestamp(endDate).normalize()
+        if e_dt < s_dt:
+            raise ValueError("endDate is before startDate")
+        step = pd.Timedelta(days=max(int(chunk_days), 1))
+        one = pd.Timedelta(days=1)
+
+        windows = []
+        a = s_dt
+        while a <= e_dt:
+            b = min(a + step - one, e_dt)
+            windows.append((a, b))
+            a = b + one
+
+        stats = {"requests": 0, "splits": 0}
+        lock = threading.Lock()
+
+        def fetch(a: pd.Timestamp, b: pd.Timestamp) -> list[pd.DataFrame]:
+            if limiter is not None:
+                limiter.acquire()
+            with lock:
+                stats["requests"] += 1
+            splittable = (b - a).days + 1 >= 2 * min_days
+            try:
+                df = self.history(symbol, startDate=f"{a:%Y-%m-%d}", endDate=f"{b:%Y-%m-%d}",
+                                  out="df", timeout=timeout, **history_kwargs)
+            except requests.Timeout:
+                if not splittable:
+                    raise
+                df = None
+            if df is not None and (len(df) < row_cap or not splittable):
+                if len(df) >= row_cap:
+                    log.warning("%s %s..%s: %d rows at the cap and window cannot be split further",
+                                symbol, f"{a:%Y-%m-%d}", f"{b:%Y-%m-%d}", len(df))
+                return [df]
+
+            with lock:
+                stats["splits"] += 1
+            mid = a + pd.Timedelta(days=((b - a).days + 1) // 2 - 1)
+            return fetch(a, mid) + fetch(mid + one, b)
+
+        if max_workers > 1 and len(windows) > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                parts = [f for fs in pool.map(lambda w: fetch(*w), windows) for f in fs]
+        else:
+            parts = [f for w in windows for f in fetch(*w)]
+
+        log.info("%s %s..%s: %d requests, %d splits", symbol, startDate, endDate,
+                 stats["requests"], stats["splits"])
+
+        parts = [f for f in parts if len(f)]
+        if not parts:
+            return pd.DataFrame()
+        df = pd.concat(parts, ignore_index=True)
+        if "symbol" in df.columns and isinstance(parts[0]["symbol"].dtype, pd.CategoricalDtype):
+            df["symbol"] = df["symbol"].astype("category")
+        keys = [c for c in ("symbol", "date") if c in df.columns]
+        return df.drop_duplicates(subset=keys, keep="last").sort_values("date", kind="stable").reset_index(drop=True)
+
+    @staticmethod
+    def _read_csv(buf: io.BytesIO, cols: list[str], *, compact: bool, arrow: bool) -> pd.DataFrame:
+        """
+        Parse a Barchart CSV payload straight from the response bytes.
+
+        compact=True: float32 prices, int32 volume/OI (int64 past the int32 range,
+        float64 if a value is missing) and a categorical symbol, instead of
+        float64/int64/object.
+        arrow=True: pyarrow parser and Arrow-backed columns (needs pyarrow); Arrow
+        integers are nullable, so compact volume/OI stay int64 there.
+        """
+        if arrow:
+            try:
+                import pyarrow as pa
+            except ImportError as e:
+                raise ImportError("arrow=True requires pyarrow") from e
+
+            dtype: dict[str, Any] = {}
+            if compact:
+                dtype.update({c: pd.ArrowDtype(pa.float32()) for c in _PRICE_COLS})
+                dtype.update({c: pd.ArrowDtype(pa.int64()) for c in _COUNT_COLS if c in cols})
+                if "symbol" in cols:
+                    dtype["symbol"] = pd.ArrowDtype(pa.dictionary(pa.int32(), pa.string()))
+            df = pd.read_csv(buf, header=None, names=cols, engine="pyarrow",
+                             dtype_backend="pyarrow", dtype=dtype or None)
+            df["date"] = df["date"].astype(pd.ArrowDtype(pa.timestamp("s")))
+            return df
+
+        dtype = {}
+        if compact:
+            dtype.update({c: np.float32 for c in _PRICE_COLS})
+            if "symbol" in cols:
+                dtype["symbol"] = "category"
+        df = pd.read_csv(
+            buf,
+            header=None,
+            names=cols,
+            dtype=dtype or None,
+            parse_dates=["date"],
+            date_format="%Y-%m-%d"
+        )
+        if compact:
+            for c in _COUNT_COLS:
+                if c in df.columns:
+                    col = df[c]
+                    if col.isna().any():
+                        df[c] = col.astype(np.float64)      # exact up to 2**53
+                    elif col.abs().max() <= np.iinfo(np.int32).max:
+                        df[c] = col.astype(np.int32)
+                    else:
+                        df[c] = col.astype(np.int64)
+        return df
@@ -3,13 +3,19 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Dict, Iterable, List, Optional, Tuple, Union
 
+import os
+import numpy as np
 import pandas as pd
 import random
 import re
+import sqlite3
+import threading
 import time
+import warnings
 
 # ==============================
 # Symbol & month utilities
@@ -19,6 +25,7 @@ _MONTH_CODE = {"F":1,"G":2,"H":3,"J":4,"K":5,"M":6,"N":7,"Q":8,"U":9,"V":10,"X":
 _MONTH_CODE_INV = {v:k for k,v in _MONTH_CODE.items()}
 _CONTRACT_RE = re.compile(r"^([A-Z]+)([FGHJKMNQUVXZ])(\d{2})$")
 
+@lru_cache(maxsize=65536)
 def parse_symbol(sym: str) -> Tuple[str, int, int, str]:
     """
     'KCZ25' -> ('KC', 12, 2025, 'Z')
@@ -31,6 +38,36 @@ def parse_symbol(sym: str) -> Tuple[str, int, int, str]:
     year4 = 2000 + year2 if year2 <= 69 else 1900 + year2
     return root, _MONTH_CODE[mcode], year4, mcode
 
+def parse_symbols(symbols: Union[pd.Series, Iterable[str]], errors: str = "raise") -> pd.DataFrame:
+    """
+    Vectorized parse_symbol over a whole symbol column: each distinct symbol is
+    parsed once, then broadcast back. Columns: root, month, year, mcode, exp_key.
+    errors="coerce" leaves unparsable rows as missing instead of raising.
+    """
+    s = symbols if isinstance(symbols, pd.Series) else pd.Series(list(symbols), dtype=object)
+    codes, uniq = pd.factorize(s)
+    parts = pd.Series(uniq, dtype=object).str.extract(_CONTRACT_RE.pattern)
+    bad = parts[0].isna().to_numpy()
+    if errors == "raise" and bad.any():
+        raise ValueError(f"Cannot parse contract symbol: {uniq[np.flatnonzero(bad)[0]]}")
+
+    yy = pd.to_numeric(parts[2]).to_numpy()
+    year = np.where(yy <= 69, 2000 + yy, 1900 + yy)
+    month = parts[1].map(_MONTH_CODE).to_numpy(dtype=float)
+    table = pd.DataFrame({
+        "root": parts[0].to_numpy(dtype=object),
+        "month": month,
+        "year": year,
+        "mcode": parts[1].to_numpy(dtype=object),
+        "exp_key": year * 12 + month,
+    })
+    if not bad.any():
+        table = table.astype({"month": np.int64, "year": np.int64, "exp_key": np.int64})
+
+    out = table.reindex(np.where(codes < 0, len(table), codes))
+    out.index = s.index
+    return out
+
 def expiry_key(sym: str) -> int:
     _, m, y, _ = parse_symbol(sym)
     return y * 12 + m
@@ -39,13 +76,66 @@ def month_letters_to_nums(months: Iterable[str]) -> List[int]:
     return [_MONTH_CODE[m.strip().upper()] for m in months]
 
 def step_symbol(sym: str, steps: int, cycle_months: List[int]) -> str:
-    root, m, y, _ = parse_symbol(sym)
-    pos = cycle_months.index(m)
-    pos2 = pos + steps
-    new_m = cycle_months[pos2 % len(cycle_months)]
-    year_bump = pos2 // len(cycle_months)
-    new_y = y + year_bump
-    return f"{root}{_MONTH_CODE_INV[new_m]}{str(new_y)[-2:]}"
+    root = parse_symbol(sym)[0]
+    return contract_calendar(root, tuple(cycle_months)).step(sym, steps)
+
+
+class ContractCalendar:
+    """
+    Every contract of one (root, cycle) from 1970 to 2069 (the span of two-digit
+    years, see parse_symbol), laid out on an integer ordinal: consecutive listed
+    contracts are consecutive integers, so stepping, distance and ordering are
+    integer arithmetic. Build through contract_calendar() to share instances.
+    """
+    FIRST_YEAR = 1970
+    YEARS = 100
+
+    def __init__(self, root: str, cycle: Tuple[int, ...]):
+        self.root = root
+        self.cycle = tuple(sorted(set(cycle)))
+        self.symbols = [f"{root}{_MONTH_CODE_INV[m]}{y % 100:02d}"
+                        for y in range(self.FIRST_YEAR, self.FIRST_YEAR + self.YEARS)
+                        for m in self.cycle]
+        self._ordinal = {sym: i for i, sym in enumerate(self.symbols)}
+        # exp_key of every ordinal (sorted), for date -> ordinal lookups
+        self._keys = np.array([y * 12 + m for y in range(self.FIRST_YEAR, self.FIRST_YEAR + self.YEARS)
+                               for m in self.cycle])
+
+    def ordinal(self, sym: str) -> int:
+        try:
+            return self._ordinal[sym]
+        except KeyError:
+            raise ValueError(f"{sym} is not a {self.root} contract on cycle {list(self.cycle)}") from None
+
+    def ordinals(self, symbols: Iterable[str]) -> np.ndarray:
+        return np.fromiter((self.ordinal(s) for s in symbols), dtype=np.int64)
+
+    def symbol(self, ordinal: int) -> str:
+        if not 0 <= ordinal < len(self.symbols):
+            raise ValueError(f"Contract ordinal {ordinal} is outside {self.FIRST_YEAR}-{self.FIRST_YEAR + self.YEARS - 1}")
+        return self.symbols[ordinal]
+
+    def step(self, sym: str, steps: int) -> str:
+        return self.symbol(self.ordinal(sym) + steps)
+
+    def distance(self, from_sym: str, to_sym: str) -> int:
+        return self.ordinal(to_sym) - self.ordinal(from_sym)
+
+    def first_on_or_after(self, dt: pd.Timestamp) -> int:
+        """Ordinal of the first contract whose month is `dt`'s month or later."""
+        return int(np.searchsorted(self._keys, dt.year * 12 + dt.month, side="left"))
+
+    def ladder(self, start_dt: pd.Timestamp, end_dt: pd.Timestamp) -> List[str]:
+        """Contracts whose month starts within [start_dt, end_dt], in expiry order."""
+        k0 = start_dt.year * 12 + start_dt.month + (start_dt.day > 1 or start_dt != start_dt.normalize())
+        i0 = int(np.searchsorted(self._keys, k0, side="left"))
+        i1 = int(np.searchsorted(self._keys, end_dt.year * 12 + end_dt.month, side="right"))
+        return self.symbols[i0:i1]
+
+
+@lru_cache(maxsize=256)
+def contract_calendar(root: str, cycle: Tuple[int, ...]) -> ContractCalendar:
+    return ContractCalendar(root, cycle)
 
 
 # Defaults for roots that don’t trade all 12 months (extend as needed)
@@ -54,6 +144,37 @@ DEFAULT_ROOT_CYCLES: Dict[str, List[int]] = {
 }
 
 
+# ==============================
+# Rate limiting
+# ==============================
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` requests per second on average, with bursts
+    of up to `burst` back-to-back requests. Shared by all fetch workers.
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be > 0 and burst >= 1")
+        self.rate = float(rate)
+        self.burst = int(burst)
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
 # ==============================
 # Fetcher interface + adapter
 # ==============================
@@ -71,18 +192,44 @@ class BaseFetcher:
 class BarchartFetcher(BaseFetcher):
     """
     Adapter for your BarchartHistoricalData client (has .history(...)->df).
+
+    With a `limiter` (TokenBucket), calls are paced by the shared bucket instead of
+    the fixed sleep, so several workers can fetch concurrently within Barchart's limits.
+
+    With `chunk_days`, dated requests go through client.history_range(): the window is
+    split into chunks (and re-split when a chunk hits `row_cap`), each chunk paced by
+    the limiter.
     """
     def __init__(self, client, *, data: str = "daily", maxrecords: int = 640,
-                 order: str = "asc", out: str = "df"):
+                 order: str = "asc", out: str = "df",
+                 limiter: Optional[TokenBucket] = None,
+                 chunk_days: Optional[int] = None, row_cap: int = 5000):
         self.client = client
         self.data = data
         self.maxrecords = maxrecords
         self.order = order
         self.out = out
+        self.limiter = limiter
+        self.chunk_days = chunk_days
+        self.row_cap = row_cap
 
     def fetch_one(self, symbol: str, start: Optional[str], end: Optional[str]) -> pd.DataFrame:
-        # throttle: fixed + random jitter
-        time.sleep(1.0 + random.uniform(1.0, 4.5))
+        if self.chunk_days is not None and start is not None and end is not None:
+            return self.client.history_range(
+                symbol, start, end,
+                chunk_days=self.chunk_days,
+                row_cap=self.row_cap,
+                limiter=self.limiter,
+                max_workers=1,
+                data=self.data,
+                order=self.order,
+            )
+
+        if self.limiter is not None:
+            self.limiter.acquire()
+        else:
+            # throttle: fixed + random jitter
+            time.sleep(1.0 + random.uniform(1.0, 4.5))
 
         return self.client.history(
             symbol=symbol,
@@ -95,17 +242,396 @@ class BarchartFetcher(BaseFetcher):
         )
 
 
+# ==============================
+# Persistent per-contract price cache
+# ==============================
+
+_CACHE_KEYS = ["symbol", "date"]
+# Columns of caches created before the stored columns were recorded per symbol
+_CACHE_LEGACY_FIELDS = ["open", "high", "low", "close", "volume", "openInterest"]
+
+
+class CachedFetcher(BaseFetcher):
+    """
+    Wraps another fetcher with a local SQLite store (one table per root, plus a
+    `coverage` table recording the dates held for each symbol).
+
+    - Expired contracts (contract month already over) are served entirely from
+      disk once their coverage was fetched after expiry. A contract cached while
+      it was live gets one final tail top-up first, then counts as closed.
+    - Live contracts only fetch the missing tail: start = last stored date + 1.
+    - A request starting before the window first fetched refetches the full range.
+    - Every column the wrapped fetcher returns is stored (price tables gain columns
+      as new ones show up), and a symbol is served with the columns it was fetched
+      with, e.g. 'settlement' / 'last'.
+
+    `stats()` reports the hit ratio (requests served without any download) and an
+    estimate of the bytes not downloaded
+    (rows served from disk x CSV bytes per row measured at fetch time).
+    """
+    def __init__(self, fetcher: BaseFetcher, path: str = "barchart_cache.sqlite"):
+        self.fetcher = fetcher
+        self.path = path
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        self._con = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS coverage ("
+                "symbol TEXT PRIMARY KEY, start_date TEXT, last_date TEXT, "
+                "bytes_per_row REAL, fetched_at TEXT, columns TEXT)"
+            )
+            if "columns" not in self._table_columns("coverage"):
+                self._con.execute("ALTER TABLE coverage ADD COLUMN columns TEXT")
+            self._con.commit()
+        self.requests = 0
+        self.hits = 0
+        self.partial = 0
+        self.misses = 0
+        self.rows_from_cache = 0
+        self.bytes_saved = 0.0
+
+    @staticmethod
+    def _table(symbol: str) -> str:
+        root, _, _, _ = parse_symbol(symbol)
+        return f"prices_{root}"
+
+    def _table_columns(self, table: str) -> List[str]:
+        # Caller holds the lock
+        return [r[1] for r in self._con.execute(f'PRAGMA table_info("{table}")')]
+
+    def _fields(self, symbol: str) -> List[str]:
+        # Columns stored for `symbol`, in fetch order
+        with self._lock:
+            row = self._con.execute("SELECT columns FROM coverage WHERE symbol = ?", (symbol,)).fetchone()
+        if row is None or row[0] is None:
+            return list(_CACHE_LEGACY_FIELDS)
+        return row[0].split(",")
+
+    @staticmethod
+    def _month_end(symbol: str) -> pd.Timestamp:
+        _, m, y, _ = parse_symbol(symbol)
+        return pd.Timestamp(y, m, 1) + pd.offsets.MonthEnd(1)
+
+    @classmethod
+    def is_expired(cls, symbol: str, today: Optional[pd.Timestamp] = None) -> bool:
+        today = pd.Timestamp.today().normalize() if today is None else pd.Timestamp(today)
+        return cls._month_end(symbol) < today
+
+    @classmethod
+    def is_closed(cls, symbol: str, fetched_at: Optional[str]) -> bool:
+        # Stored rows are final only if they were fetched after the contract expired
+        return fetched_at is not None and pd.Timestamp(fetched_at).normalize() > cls._month_end(symbol)
+
+    def _coverage(self, symbol: str) -> Optional[tuple]:
+        with self._lock:
+            return self._con.execute(
+                "SELECT start_date, last_date, bytes_per_row, fetched_at FROM coverage WHERE symbol = ?",
+                (symbol,),
+            ).fetchone()
+
+    def _touch(self, symbol: str) -> None:
+        # Record a fetch that returned no new rows (e.g. the final top-up of a
+        # contract whose stored rows were already complete)
+        with self._lock:
+            self._con.execute(
+                "UPDATE coverage SET fetched_at = ? WHERE symbol = ?",
+                (pd.Timestamp.now().isoformat(timespec="seconds"), symbol),
+            )
+            self._con.commit()
+
+    def _load(self, symbol: str, start: Optional[str], end: Optional[str]) -> pd.DataFrame:
+        cols = _CACHE_KEYS + self._fields(symbol)
+        select = ", ".join(f'"{c}"' for c in cols)
+        sql = f"SELECT {select} FROM {self._table(symbol)} WHERE symbol = ?"
+        params: list = [symbol]
+        if start is not None:
+            sql += " AND date >= ?"
+            params.append(pd.Timestamp(start).strftime("%Y-%m-%d"))
+        if end is not None:
+            sql += " AND date <= ?"
+            params.append(pd.Timestamp(end).strftime("%Y-%m-%d"))
+        with self._lock:
+            try:
+                df = pd.read_sql_query(sql + " ORDER BY date", self._con, params=params)
+            except (sqlite3.OperationalError, pd.errors.DatabaseError):
+                return pd.DataFrame(columns=cols)
+        df["date"] = pd.to_datetime(df["date"])
+        return df
+
+    def _store(self, symbol: str, df: pd.DataFrame, start: Optional[str], top_up: bool) -> None:
+        # `start` is the requested window start (None: from inception); a top-up keeps
+        # the window recorded by the first fetch
+        fields = [c for c in df.columns if c not in _CACHE_KEYS]
+        f = df.reindex(columns=_CACHE_KEYS + fields).copy()
+        f["symbol"] = symbol
+        f["date"] = pd.to_datetime(f["date"], errors="coerce").dt.strftime("%Y-%m-%d")
+        f = f.dropna(subset=["date"])
+        if f.empty:
+            return
+        bpr = len(f.to_csv(index=False, header=False)) / len(f)
+        table = self._table(symbol)
+        with self._lock:
+            cur = self._con.cursor()
+            cur.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (symbol TEXT, date TEXT, open REAL, high REAL, "
+                "low REAL, close REAL, volume REAL, openInterest REAL, PRIMARY KEY (symbol, date))"
+            )
+            have = set(self._table_columns(table))
+            for c in fields:
+                if c not in have:
+                    kind = "REAL" if pd.api.types.is_numeric_dtype(f[c].dtype) else "TEXT"
+                    cur.execute(f'ALTER TABLE {table} ADD COLUMN "{c}" {kind}')
+            names = ", ".join(f'"{c}"' for c in f.columns)
+            marks = ", ".join("?" * len(f.columns))
+            cur.executemany(
+                f"INSERT OR REPLACE INTO {table} ({names}) VALUES ({marks})",
+                f.astype(object).where(f.notna(), None).itertuples(index=False, name=None),
+            )
+            last = cur.execute(
+                f"SELECT MAX(date) FROM {table} WHERE symbol = ?", (symbol,)
+            ).fetchone()[0]
+            prev = cur.execute("SELECT start_date, columns FROM coverage WHERE symbol = ?", (symbol,)).fetchone()
+            if top_up:
+                start_date = prev[0] if prev else None
+                stored = prev[1].split(",") if prev and prev[1] else list(_CACHE_LEGACY_FIELDS)
+                fields = stored + [c for c in fields if c not in stored]
+            else:
+                start_date = None if start is None else pd.Timestamp(start).strftime("%Y-%m-%d")
+            cur.execute(
+                "INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?, ?, ?)",
+                (symbol, start_date, last, bpr, pd.Timestamp.now().isoformat(timespec="seconds"),
+                 ",".join(fields)),
+            )
+            self._con.commit()
+
+    def _count(self, what: str, served: int = 0, bpr: float = 0.0) -> None:
+        with self._lock:
+            self.requests += 1
+            setattr(self, what, getattr(self, what) + 1)
+            self.rows_from_cache += served
+            self.bytes_saved += served * bpr
+
+    def fetch_one(self, symbol: str, start: Optional[str], end: Optional[str]) -> pd.DataFrame:
+        cov = self._coverage(symbol)
+        covers_start = cov is not None and (
+            cov[0] is None or (start is not None and pd.Timestamp(start) >= pd.Timestamp(cov[0]))
+        )
+
+        if covers_start:
+            _, last, bpr, fetched_at = cov
+            last_ts = pd.Timestamp(last)
+            expired = self.is_expired(symbol)
+            if (expired and self.is_closed(symbol, fetched_at)) or (end is not None and pd.Timestamp(end) <= last_ts):
+                df = self._load(symbol, start, end)
+                self._count("hits", len(df), bpr or 0.0)
+                return df
+
+            # Live contract: top up the tail only. Expired but cached while live:
+            # one final top-up to the last trading day, after which it is closed
+            tail_start = (last_ts + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+            new = self.fetcher.fetch_one(symbol, tail_start, None if expired else end)
+            if new is not None and len(new):
+                self._store(symbol, new, start, top_up=True)
+            elif expired and new is not None:
+                self._touch(symbol)
+            df = self._load(symbol, start, end)
+            self._count("partial", max(len(df) - (0 if new is None else len(new)), 0), bpr or 0.0)
+            return df
+
+        new = self.fetcher.fetch_one(symbol, start, end)
+        if new is None or len(new) == 0:
+            self._count("misses")
+            return new
+        self._store(symbol, new, start, top_up=False)
+        self._count("misses")
+        return self._load(symbol, start, end)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            n = self.requests
+            return {
+                "requests": n,
+                "hits": self.hits,
+                "partial": self.partial,
+                "misses": self.misses,
+                "hit_ratio": self.hits / n if n else 0.0,
+                "rows_from_cache": self.rows_from_cache,
+                "bytes_saved": int(self.bytes_saved),
+            }
+
+
+# ==============================
+# Roll engine
+# ==============================
+
+def _contract_matrix(all_df: pd.DataFrame, field: str) -> Tuple[pd.DatetimeIndex, np.ndarray, np.ndarray]:
+    # Scatter one field of the stacked contracts into a date x contract float
+    # matrix, contracts in expiry order, NaN where a contract has no row
+    d_codes, dates = pd.factorize(all_df["date"], sort=True)
+    meta = all_df[["source_symbol","exp_key"]].drop_duplicates("source_symbol").sort_values("exp_key", kind="stable")
+    syms = meta["source_symbol"].to_numpy()
+    c_codes = pd.Index(syms).get_indexer(all_df["source_symbol"])
+
+    mat = np.full((len(dates), len(syms)), np.nan)
+    mat[d_codes, c_codes] = pd.to_numeric(all_df[field], errors="coerce").to_numpy(dtype=float)
+    return pd.DatetimeIndex(dates), syms, mat
+
+
+class RollRule:
+    """
+    Implement .roll_dates(all_df, not_before) -> Series indexed by source_symbol
+    giving each contract's roll-out date: the first date on which it is no longer
+    held. NaT means the contract is held until it leaves the data (the default
+    splice). `not_before` is set by update(): every contract passed in was still
+    held on that date, which path-dependent rules use as their starting point.
+
+    On every date, contracts are ranked by expiry among those not rolled out yet,
+    so nearby-1 is the earliest contract still held, nearby-2 the next one, etc.
+
+    `max_lead` is how many contracts past the calendar front the rule may already
+    hold; ladders built from a root are padded by it so every line has a contract.
+    """
+    max_lead: int = 1
+
+    def roll_dates(self, all_df: pd.DataFrame, not_before: Optional[pd.Timestamp] = None) -> pd.Series:
+        raise NotImplementedError
+
+
+class ExpiryRoll(RollRule):
+    """Hold every contract until its last row (same as building with roll=None)."""
+    max_lead = 0
+
+    def roll_dates(self, all_df: pd.DataFrame, not_before: Optional[pd.Timestamp] = None) -> pd.Series:
+        syms = pd.unique(all_df["source_symbol"])
+        return pd.Series(pd.NaT, index=syms, dtype="datetime64[ns]")
+
+
+class CalendarRoll(RollRule):
+    """
+    Roll `days_before` business days ahead of a reference date per contract.
+
+    `calendar` is an exchange calendar table with a 'symbol' column and the
+    reference date in `column` (e.g. 'last_trade_date', 'first_notice_date').
+    Without a calendar the reference is the contract's last row in the data, for
+    contracts that stop before the data's last date; contracts still trading on
+    that date have no known expiry yet and are held. Contracts missing from the
+    calendar are held until they leave the data.
+
+    The calendar-less reference moves as data arrives (a contract's last row is
+    only final once it expires), so update() requires a calendar with this rule.
+    """
+    def __init__(self, days_before: int = 5, *, calendar: Optional[pd.DataFrame] = None,
+                 column: str = "last_trade_date"):
+        if days_before < 0:
+            raise ValueError("days_before must be >= 0")
+        self.days_before = int(days_before)
+        self.column = column
+        self.max_lead = 1 + self.days_before // 21      # ~21 business days per month
+        self._ref: Optional[pd.Series] = None
+        if calendar is not None:
+            ref = pd.to_datetime(calendar[column], errors="coerce")
+            self._ref = pd.Series(ref.to_numpy(), index=calendar["symbol"].to_numpy())
+
+    def roll_dates(self, all_df: pd.DataFrame, not_before: Optional[pd.Timestamp] = None) -> pd.Series:
+        if self._ref is None:
+            ref = all_df.groupby("source_symbol", sort=False)["date"].max()
+            ref = ref.where(ref < all_df["date"].max())
+        else:
+            syms = pd.unique(all_df["source_symbol"])
+            ref = self._ref[~self._ref.index.duplicated(keep="last")].reindex(syms)
+
+        days = ref.to_numpy(dtype="datetime64[D]")
+        ok = ~np.isnat(days)
+        out = np.full(len(days), np.datetime64("NaT"), dtype="datetime64[D]")
+        out[ok] = np.busday_offset(days[ok], -self.days_before, roll="backward")
+        return pd.Series(out.astype("datetime64[ns]"), index=ref.index)
+
+
+class FirstNoticeRoll(CalendarRoll):
+    """
+    Roll `days_before` business days ahead of first notice day, read from an
+    exchange calendar table with columns 'symbol' and 'first_notice_date'.
+    """
+    def __init__(self, calendar: pd.DataFrame, days_before: int = 1, *,
+                 column: str = "first_notice_date"):
+        super().__init__(days_before, calendar=calendar, column=column)
+
+
+class CrossoverRoll(RollRule):
+    """
+    Roll into the next contract once its `field` ('volume' or 'openInterest')
+    exceeds the held contract's for `confirm_days` consecutive dates. The switch
+    takes effect on the next date, so no roll uses same-day information.
+
+    Crossovers are evaluated at once over a date x contract matrix; a contract
+    only rolls on crossovers after the previous one has rolled, so early noise
+    between deferred months is ignored.
+
+    Liquidity can move more than one contract ahead of the calendar front (e.g.
+    grains rolling into the next new-crop month); `max_lead` bounds that for ladders
+    built from a root.
+    """
+    def __init__(self, field: str = "openInterest", confirm_days: int = 1, max_lead: int = 2):
+        if confirm_days < 1:
+            raise ValueError("confirm_days must be >= 1")
+        if max_lead < 1:
+            raise ValueError("max_lead must be >= 1")
+        self.field = field
+        self.confirm_days = int(confirm_days)
+        self.max_lead = int(max_lead)
+
+    def roll_dates(self, all_df: pd.DataFrame, not_before: Optional[pd.Timestamp] = None) -> pd.Series:
+        if self.field not in all_df.columns:
+            raise KeyError(f"CrossoverRoll needs a '{self.field}' column.")
+
+        dates, syms, mat = _contract_matrix(all_df, self.field)
+
+        # cross[d, j]: contract j+1 beats contract j on date d (NaN never wins)
+        cross = mat[:, 1:] > mat[:, :-1]
+        k = self.confirm_days
+        if k > 1:
+            run = np.cumsum(cross, axis=0)
+            run[k:] -= run[:-k].copy()
+            cross = run >= k
+
+        # Last date row of each contract: without a roll it is held until then
+        present = ~np.isnan(mat)
+        last_row = len(dates) - 1 - np.argmax(present[::-1], axis=0)
+
+        out = np.full(len(syms), np.datetime64("NaT"), dtype="datetime64[ns]")
+        dvals = dates.to_numpy(dtype="datetime64[ns]")
+        floor = 0                                   # first date row the next roll may use
+        if not_before is not None:
+            floor = max(int(np.searchsorted(dvals, np.datetime64(not_before, "ns"), side="right")) - 1, 0)
+        for j in range(cross.shape[1]):
+            hits = np.flatnonzero(cross[:, j])
+            pos = np.searchsorted(hits, floor)
+            if pos == len(hits) or hits[pos] + 1 >= len(dvals):
+                floor = max(floor, last_row[j] + 1)
+                continue
+            eff = hits[pos] + 1
+            out[j] = dvals[eff]
+            floor = eff
+        return pd.Series(out, index=syms)
+
+
 # ==============================
 # Continuous nearby builder (simplified + anchored padding)
 # ==============================
 
-@dataclass(frozen=True)
-class Segment:
-    segment_start: pd.Timestamp
-    segment_end: pd.Timestamp
-    line: int
-    source_symbol: str
-    n_rows: int
+# Segment table schema, one row per run of one contract on one line:
+#   segment_start, segment_end  first / last date of the run
+#   line, source_symbol, n_rows line number, contract held, rows in the run
+#   roll_date                   first date on the next contract (NaT: still held)
+#   roll_gap                    next contract's first price - this one's last price
+#   roll_ratio                  next contract's first price / this one's last price
+_SEGMENT_DTYPES = {
+    "segment_start": "datetime64[ns]", "segment_end": "datetime64[ns]", "line": np.int64,
+    "source_symbol": object, "n_rows": np.int64, "roll_date": "datetime64[ns]",
+    "roll_gap": np.float64, "roll_ratio": np.float64,
+}
 
 
 class ContinuousFuturesBuilder:
@@ -115,8 +641,20 @@ class ContinuousFuturesBuilder:
     Simple API:
       - build_from_root(root, line_number, start, end, months=None, current_front=None, return_segments=False)
       - build(contracts_or_data, line_number, start=None, end=None, return_segments=False)
+      - build_lines_from_root(root, lines, start, end, ..., wide=False) / build_lines(contracts_or_data, lines, ...)
+        several nearby lines from one fetch and one ranking pass
 
     Keeps all price fields it finds; does NOT synthesize a 'value' column.
+
+    `roll` picks when contracts are rolled out (CalendarRoll, FirstNoticeRoll,
+    CrossoverRoll); by default a contract is held until it disappears from the data.
+
+    With adjustment="additive" or "ratio", every line also gets back-adjusted
+    prices (`<field>_adj`) plus `roll_adjustment` / `roll_factor`:
+      - anchor="backward" -> anchor to the most recent contract (adjust older history)
+      - anchor="forward"  -> anchor to the first contract (adjust newer history)
+    Roll gaps are measured like bbgfuturesroll: first price of the new contract
+    minus (or divided by) last price of the old one, on `adjust_field`.
     """
 
     def __init__(
@@ -126,11 +664,25 @@ class ContinuousFuturesBuilder:
         min_volume: Optional[int] = None,       # drop rows with volume <= min_volume (if volume exists)
         drop_incomplete_days: bool = True,      # drop dates with < k active contracts
         verbose: bool = True,
+        max_workers: int = 1,                   # >1: fetch contracts concurrently (pair with a rate-limited fetcher)
+        adjustment: Optional[str] = None,       # None (raw splice), "additive" or "ratio"
+        anchor: str = "backward",               # "backward" or "forward"
+        adjust_field: str = "close",            # field the roll gaps are measured on
+        roll: Optional[RollRule] = None,        # None: hold each contract until it leaves the data
     ):
+        if adjustment not in (None, "additive", "ratio"):
+            raise ValueError("adjustment must be None, 'additive' or 'ratio'")
+        if anchor not in ("backward", "forward"):
+            raise ValueError("anchor must be 'backward' or 'forward'")
         self.fetcher = fetcher
         self.min_volume = min_volume
         self.drop_incomplete_days = drop_incomplete_days
         self.verbose = verbose
+        self.max_workers = max_workers
+        self.adjustment = adjustment
+        self.anchor = anchor
+        self.adjust_field = adjust_field
+        self.roll = roll
 
     # ---------- High-level: build from a ROOT (infers contracts for the window) ----------
 
@@ -145,8 +697,63 @@ class ContinuousFuturesBuilder:
         current_front: Optional[str] = None,   # <-- NEW: user-declared current 1st nearby (e.g., "KCZ25")
         return_segments: bool = False,
     ) -> Union[pd.DataFrame, Tuple[pd.DataFrame, pd.DataFrame]]:
+        symbols = self._root_symbols(root, line_number, start, end, months, current_front)
+
+        # 4) Delegate to regular build using this inferred list
+        out = self.build(symbols, line_number=line_number, start=start, end=end, return_segments=return_segments)
+        self._warn_short_lines(out[0] if return_segments else out, root)
+        return out
+
+    def build_lines_from_root(
+        self,
+        root: str,
+        *,
+        lines: Iterable[int],
+        start: str,
+        end: str,
+        months: Optional[Union[str, Iterable[str]]] = None,
+        current_front: Optional[str] = None,
+        wide: bool = False,
+        return_segments: bool = False,
+    ) -> Union[pd.DataFrame, Tuple[pd.DataFrame, pd.DataFrame]]:
+        """
+        Like build_from_root for several nearby lines at once: the ladder is padded
+        for the deepest line, every contract is fetched once and all lines come
+        out of a single ranking pass (see build_lines).
+        """
+        lines = sorted(set(int(k) for k in lines))
+        if not lines:
+            raise ValueError("lines must not be empty")
+        symbols = self._root_symbols(root, lines[-1], start, end, months, current_front)
+        out = self.build_lines(symbols, lines=lines, start=start, end=end, return_segments=return_segments)
+        series_df = out[0] if return_segments else out
+        self._warn_short_lines(series_df, root)
+        if wide:
+            series_df = self._wide(series_df)
+        return (series_df, out[1]) if return_segments else series_df
+
+    def _warn_short_lines(self, series_df: pd.DataFrame, root: str) -> None:
+        # A line ending before the others ran out of contracts: the ladder was too
+        # short for the roll rule (see RollRule.max_lead)
+        if series_df is None or series_df.empty or "line" not in series_df.columns:
+            return
+        ends = series_df.groupby("line")["date"].max()
+        last = ends.max()
+        for k, d in ends[ends < last].items():
+            warnings.warn(f"{root}: line {k} ends {d.date()} before {last.date()}; the contract "
+                          f"ladder is too short for the roll rule (raise its max_lead).", stacklevel=3)
+
+    def _root_symbols(
+        self,
+        root: str,
+        line_number: int,
+        start: str,
+        end: str,
+        months: Optional[Union[str, Iterable[str]]],
+        current_front: Optional[str],
+    ) -> List[str]:
         if self.fetcher is None:
-            raise ValueError("build_from_root requires a fetcher (e.g., BarchartFetcher).")
+            raise ValueError("Building from a root requires a fetcher (e.g., BarchartFetcher).")
 
         if months is None:
             cycle = DEFAULT_ROOT_CYCLES.get(root.upper(), list(range(1, 13)))
@@ -158,9 +765,10 @@ class ContinuousFuturesBuilder:
         root = root.upper()
         s_dt = pd.to_datetime(start).normalize()
         e_dt = pd.to_datetime(end).normalize()
+        cal = contract_calendar(root, tuple(cycle))
 
         # 1) Base ladder over [start, end]
-        ladder = self._generate_symbol_ladder(root, cycle, s_dt, e_dt)
+        ladder = cal.ladder(s_dt, e_dt)
 
         # 2) Decide which symbol should be the "front at end"
         if current_front is not None:
@@ -179,22 +787,299 @@ class ContinuousFuturesBuilder:
             # But since we only fetch forward months minimally, seed with front_at_end directly.
             ladder = [front_at_end]
 
-        last_sym = ladder[-1]
-        pads = self._steps_forward(last_sym, front_at_end, cycle) + max(line_number - 1, 0)
-
-        to_add: List[str] = []
-        cur = last_sym
-        for _ in range(pads):
-            cur = step_symbol(cur, 1, cycle)
-            to_add.append(cur)
+        #    A roll rule that leaves the front before expiry may hold up to its
+        #    max_lead contracts past the calendar front: pad by that too.
+        last = cal.ordinal(ladder[-1])
+        lead = 0 if self.roll is None else int(getattr(self.roll, "max_lead", 1))
+        pads = max(cal.ordinal(front_at_end) - last, 0) + max(line_number - 1, 0) + lead
+        to_add = cal.symbols[last + 1:last + 1 + pads]
 
         # Merge, de-duplicate (preserve order)
         merged = ladder + to_add
         seen: set[str] = set()
-        symbols = [s for s in merged if not (s in seen or seen.add(s))]
+        return [s for s in merged if not (s in seen or seen.add(s))]
 
-        # 4) Delegate to regular build using this inferred list
-        return self.build(symbols, line_number=line_number, start=start, end=end, return_segments=return_segments)
+
+    # ---------- Batch: many roots, one fetch queue ----------
+
+    def build_roots(
+        self,
+        roots: Union[Iterable[str], Dict[str, Iterable[int]]],
+        *,
+        start: str,
+        end: str,
+        lines: Iterable[int] = (1,),
+        months: Optional[Dict[str, Union[str, Iterable[str]]]] = None,
+        current_front: Optional[Dict[str, str]] = None,
+        wide: bool = False,
+        panel: bool = False,
+        return_metrics: bool = False,
+    ) -> Union[Dict[str, pd.DataFrame], pd.DataFrame, Tuple[object, pd.DataFrame]]:
+        """
+        Build nearby lines for many roots in one go. `roots` is a list (every root
+        gets `lines`) or {root: lines}; `months` / `current_front` are per root.
+
+        The contract ladders of all roots are merged and de-duplicated, then fetched
+        through one worker pool (`max_workers`) on the builder's fetcher, so a single
+        authenticated client and rate limiter serve the whole batch, e.g.:
+            client = BarchartHistoricalData(pool_maxsize=8)
+            fetcher = BarchartFetcher(client, limiter=TokenBucket(rate=2, burst=4))
+            ContinuousFuturesBuilder(fetcher, max_workers=8).build_roots([...], ...)
+
+        Returns {root: series} (see build_lines), or with panel=True one long frame
+        with a 'root' column. With return_metrics=True also a per-root table:
+        contracts, failed, fetch_s (summed request time), build_s, rows.
+        A contract whose fetch raises is reported and skipped, not fatal.
+        """
+        if self.fetcher is None:
+            raise ValueError("build_roots requires a fetcher (e.g., BarchartFetcher).")
+        if not isinstance(roots, dict):
+            roots = {r: lines for r in roots}
+        spec = {r.upper(): sorted(set(int(k) for k in ls)) for r, ls in roots.items()}
+        months = {k.upper(): v for k, v in (months or {}).items()}
+        current_front = {k.upper(): v for k, v in (current_front or {}).items()}
+
+        ladders, fetched, timing = self._fetch_roots({r: ls[-1] for r, ls in spec.items()},
+                                                     start, end, months, current_front)
+
+        # Per-root builds out of the shared pool of contracts
+        out: Dict[str, pd.DataFrame] = {}
+        metrics = []
+        for r, ls in spec.items():
+            data = {s: fetched[s] for s in ladders[r] if fetched[s] is not None and len(fetched[s])}
+            t0 = time.perf_counter()
+            series_df = self.build_lines(data, lines=ls, start=start, end=end) if data else self._empty_series_df()
+            self._warn_short_lines(series_df, r)
+            build_s = time.perf_counter() - t0
+            out[r] = self._wide(series_df) if wide else series_df
+
+            m = {"root": r, "contracts": len(ladders[r]),
+                 "failed": sum(fetched[s] is None for s in ladders[r]),
+                 "fetch_s": sum(timing.get(s, 0.0) for s in ladders[r]),
+                 "build_s": build_s, "rows": len(series_df)}
+            metrics.append(m)
+            if self.verbose:
+                print(f"{r}: {m['contracts']} contracts ({m['failed']} failed), "
+                      f"fetch {m['fetch_s']:.1f}s, build {m['build_s']:.2f}s, {m['rows']} rows.")
+
+        res: object = out
+        if panel and wide:
+            res = pd.concat(out, axis=1, names=["root"])
+        elif panel:
+            res = pd.concat([df.assign(root=r) for r, df in out.items()], ignore_index=True)
+        return (res, pd.DataFrame(metrics)) if return_metrics else res
+
+    def _fetch_roots(
+        self,
+        depth: Dict[str, int],
+        start: str,
+        end: str,
+        months: Dict[str, Union[str, Iterable[str]]],
+        current_front: Dict[str, str],
+    ) -> Tuple[Dict[str, List[str]], Dict[str, Optional[pd.DataFrame]], Dict[str, float]]:
+        # 1) One ladder per root (padded to `depth` nearby lines), one de-duplicated contract set
+        ladders = {r: self._root_symbols(r, k, start, end, months.get(r), current_front.get(r))
+                   for r, k in depth.items()}
+        symbols = sorted({s for ladder in ladders.values() for s in ladder}, key=expiry_key)
+
+        # 2) One queue for every contract of every root
+        timing: Dict[str, float] = {}
+        def fetch(sym: str) -> Optional[pd.DataFrame]:
+            t0 = time.perf_counter()
+            try:
+                return self.fetcher.fetch_one(sym, start, end)
+            except Exception as e:
+                if self.verbose:
+                    print(f"Skipping {sym} — fetch failed: {e}")
+                return None
+            finally:
+                timing[sym] = time.perf_counter() - t0
+
+        if self.max_workers > 1 and len(symbols) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                fetched = dict(zip(symbols, pool.map(fetch, symbols)))
+        else:
+            fetched = {sym: fetch(sym) for sym in symbols}
+        return ladders, fetched, timing
+
+    # ---------- Curves: every listed contract, not just nearby lines ----------
+
+    def curve(
+        self,
+        contracts_or_data: Union[Iterable[str], Dict[str, pd.DataFrame]],
+        *,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        field: str = "close",
+        expiries: Optional[pd.Series] = None,
+    ) -> "FuturesCurve":
+        """
+        Forward-curve analytics (FuturesCurve) from the same contract data the lines
+        are built from: same normalization, clipping, volume filter and roll rule.
+        """
+        all_df = self._prepare_all(contracts_or_data, start, end)
+        if all_df is None:
+            raise ValueError("No contract data to build a curve from.")
+        all_df = self._apply_roll(all_df, self.roll)
+        return FuturesCurve.from_frame(all_df, field=field, expiries=expiries)
+
+    def curves_from_roots(
+        self,
+        roots: Iterable[str],
+        *,
+        start: str,
+        end: str,
+        tenors: int = 6,
+        months: Optional[Dict[str, Union[str, Iterable[str]]]] = None,
+        current_front: Optional[Dict[str, str]] = None,
+        field: str = "close",
+        expiries: Optional[pd.Series] = None,
+    ) -> Dict[str, "FuturesCurve"]:
+        """
+        {root: FuturesCurve} for many roots, ladders padded to `tenors` contracts and
+        fetched through the same shared queue as build_roots.
+        """
+        if self.fetcher is None:
+            raise ValueError("curves_from_roots requires a fetcher (e.g., BarchartFetcher).")
+        roots = [r.upper() for r in roots]
+        months = {k.upper(): v for k, v in (months or {}).items()}
+        current_front = {k.upper(): v for k, v in (current_front or {}).items()}
+        ladders, fetched, _ = self._fetch_roots({r: tenors for r in roots}, start, end, months, current_front)
+
+        out: Dict[str, FuturesCurve] = {}
+        for r in roots:
+            data = {s: fetched[s] for s in ladders[r] if fetched[s] is not None and len(fetched[s])}
+            if data:
+                out[r] = self.curve(data, start=start, end=end, field=field, expiries=expiries)
+            elif self.verbose:
+                print(f"{r}: no contract data, no curve.")
+        return out
+
+    # ---------- Incremental daily update ----------
+
+    def update(
+        self,
+        existing_series: pd.DataFrame,
+        existing_segments: Optional[pd.DataFrame] = None,
+        *,
+        as_of: Optional[str] = None,
+        months: Optional[Union[str, Iterable[str]]] = None,
+        lookback_days: int = 10,
+    ) -> Union[pd.DataFrame, Tuple[pd.DataFrame, pd.DataFrame]]:
+        """
+        Extend a series from build()/build_lines() (same builder settings) up to
+        `as_of` (default: today), without rebuilding the history.
+
+        Only contracts from the current front onwards are fetched, over the new
+        dates plus `lookback_days` (enough for a CrossoverRoll confirmation).
+        Rolls never move back to an earlier contract than the current front.
+        Adjusted series only shift their history when a new roll shows up, and
+        `existing_segments` (if given) is extended in place of being rebuilt.
+
+        A CalendarRoll without a calendar cannot be updated: its roll dates depend
+        on the last row of contracts that have not expired yet (rebuild instead).
+        """
+        if self.fetcher is None:
+            raise ValueError("update requires a fetcher (e.g., BarchartFetcher).")
+        if isinstance(self.roll, CalendarRoll) and self.roll._ref is None:
+            raise ValueError("update needs a CalendarRoll with a calendar table; "
+                             "without one, rebuild the series instead.")
+        if existing_series is None or existing_series.empty:
+            raise ValueError("update needs an existing series; use build_from_root first.")
+        adj_col = {"additive": "roll_adjustment", "ratio": "roll_factor"}.get(self.adjustment)
+        if adj_col is not None and adj_col not in existing_series.columns:
+            raise ValueError(f"existing series has no '{adj_col}' column; was it built with adjustment={self.adjustment!r}?")
+
+        series = existing_series
+        if "line" not in series.columns:
+            series = series.assign(line=1)
+        last_date = pd.Timestamp(series["date"].max())
+        as_of_dt = pd.to_datetime(as_of).normalize() if as_of is not None else pd.Timestamp.today().normalize()
+        if as_of_dt <= last_date:
+            return (existing_series, existing_segments) if existing_segments is not None else existing_series
+
+        lines = sorted(int(k) for k in series["line"].unique())
+        # Contracts held on the last date (a line that stopped earlier says nothing)
+        held = sorted(series.loc[series["date"] == last_date, "source_symbol"].unique(), key=expiry_key)
+        root = parse_symbol(held[0])[0]
+
+        # Ladder: current front -> (later of current / calendar front at `as_of`)
+        # + deepest line, which leaves one spare contract for a roll in the window
+        if months is None:
+            cycle = DEFAULT_ROOT_CYCLES.get(root.upper(), list(range(1, 13)))
+        else:
+            if isinstance(months, str):
+                months = [m for m in months.split() if m]
+            cycle = month_letters_to_nums(months)
+        cal = contract_calendar(root, tuple(cycle))
+        first = cal.ordinal(held[0])
+        base = max(first, cal.first_on_or_after(as_of_dt))
+        target = max(base + lines[-1], cal.ordinal(held[-1]) + 1)
+        symbols = cal.symbols[first:target + 1]
+
+        start = (last_date - pd.tseries.offsets.BDay(lookback_days)).strftime("%Y-%m-%d")
+        all_df = self._prepare_all(symbols, start, as_of_dt.strftime("%Y-%m-%d"))
+        if all_df is None:
+            return (existing_series, existing_segments) if existing_segments is not None else existing_series
+
+        new_rows = self._pick_lines(all_df, lines, adjust=False, not_before=last_date)
+        new_rows = new_rows[new_rows["date"] > last_date]
+        if new_rows.empty:
+            return (existing_series, existing_segments) if existing_segments is not None else existing_series
+
+        parts = []
+        for k in lines:
+            old_k = series[series["line"] == k]
+            new_k = new_rows[new_rows["line"] == k]
+            if adj_col is not None:
+                parts.append(self.extend_adjusted(old_k, new_k, method=self.adjustment,
+                                                  anchor=self.anchor, field=self.adjust_field))
+            else:
+                parts.append(pd.concat([old_k, new_k], ignore_index=True))
+        out = pd.concat(parts, ignore_index=True)
+        if "line" not in existing_series.columns:
+            out = out.drop(columns="line")
+
+        if self.verbose:
+            print(f"{root}: +{len(new_rows)} rows through {new_rows['date'].max():%Y-%m-%d} "
+                  f"({len(symbols)} contracts fetched).")
+
+        if existing_segments is None:
+            return out
+        return out, self._extend_segments(existing_segments, series, new_rows, lines)
+
+    def _extend_segments(
+        self,
+        segments: pd.DataFrame,
+        series: pd.DataFrame,
+        new_rows: pd.DataFrame,
+        lines: List[int],
+    ) -> pd.DataFrame:
+        # Segments of [line's last known row] + new rows: the first one continues
+        # the line's open segment (and brings its roll date/gap if it ended),
+        # the others are appended
+        segs = segments.copy() if not segments.empty else self._empty_segments_df()
+        for k in lines:
+            new_k = new_rows[new_rows["line"] == k]
+            if new_k.empty:
+                continue
+            mine = np.flatnonzero(segs["line"].to_numpy() == k)
+            if not len(mine):
+                add = self._segments_from_series(new_k, line_number=k, field=self.adjust_field)
+                segs = pd.concat([segs, add], ignore_index=True)
+                continue
+
+            old_k = series[series["line"] == k]
+            tail = old_k[old_k["date"] == old_k["date"].max()].iloc[-1:]
+            add = self._segments_from_series(pd.concat([tail, new_k], ignore_index=True),
+                                             line_number=k, field=self.adjust_field)
+            i = segs.index[mine[np.argmax(segs["segment_end"].to_numpy()[mine])]]
+            first = add.iloc[0]
+            segs.loc[i, ["segment_end", "roll_date", "roll_gap", "roll_ratio"]] = [
+                first["segment_end"], first["roll_date"], first["roll_gap"], first["roll_ratio"]]
+            segs.loc[i, "n_rows"] = segs.at[i, "n_rows"] + first["n_rows"] - 1
+            segs = pd.concat([segs, add.iloc[1:]], ignore_index=True)
+        return segs.sort_values(["line", "segment_start"], kind="stable").reset_index(drop=True)
 
     # ---------- Build from explicit symbols (list) or prefetched dict ----------
 
@@ -210,69 +1095,317 @@ class ContinuousFuturesBuilder:
         if line_number < 1:
             raise ValueError("line_number must be >= 1")
 
-        data = self._as_data_dict(contracts_or_data, start, end)
-        if not data:
+        all_df = self._prepare_all(contracts_or_data, start, end)
+        if all_df is None:
             empty = self._empty_series_df()
             return (empty, pd.DataFrame()) if return_segments else empty
 
+        series_df = self._pick_lines(all_df, [line_number])
+
+        if not return_segments:
+            return series_df
+
+        seg_df = self._segments_from_series(series_df, line_number=line_number, field=self.adjust_field)
+        return series_df, seg_df
+
+    def build_lines(
+        self,
+        contracts_or_data: Union[Iterable[str], Dict[str, pd.DataFrame]],
+        *,
+        lines: Iterable[int],
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        wide: bool = False,
+        return_segments: bool = False,
+    ) -> Union[pd.DataFrame, Tuple[pd.DataFrame, pd.DataFrame]]:
+        """
+        Build several nearby lines (e.g. 1..6) from one fetch and one ranking pass.
+
+        Returns the long frame of build() with one block per line (sorted by line,
+        date), or with wide=True a date x (field, line) panel.
+        """
+        lines = sorted(set(int(k) for k in lines))
+        if not lines or lines[0] < 1:
+            raise ValueError("lines must be a non-empty list of integers >= 1")
+
+        all_df = self._prepare_all(contracts_or_data, start, end)
+        if all_df is None:
+            series_df = self._empty_series_df()
+        else:
+            series_df = self._pick_lines(all_df, lines)
+
+        out = self._wide(series_df) if wide else series_df
+        if not return_segments:
+            return out
+
+        seg_df = self._segments_from_series(series_df, line_number=lines[0], field=self.adjust_field)
+        return out, seg_df
+
+    @staticmethod
+    def _wide(series_df: pd.DataFrame) -> pd.DataFrame:
+        # Numeric and symbol fields are pivoted apart: one pivot over mixed dtypes
+        # leaves every column object dtype
+        fields = [c for c in series_df.columns if c not in ("date", "line")]
+        numeric = [c for c in fields if pd.api.types.is_numeric_dtype(series_df[c])]
+        other = [c for c in fields if c not in numeric]
+        parts = [series_df.pivot(index="date", columns="line", values=cols) for cols in (numeric, other) if cols]
+        if not parts:
+            return series_df.pivot(index="date", columns="line", values=fields)
+        return pd.concat(parts, axis=1).reindex(columns=fields, level=0)
+
+    def _prepare_all(
+        self,
+        contracts_or_data: Union[Iterable[str], Dict[str, pd.DataFrame]],
+        start: Optional[str],
+        end: Optional[str],
+    ) -> Optional[pd.DataFrame]:
+        # Fetch/normalize, stack all contracts, clip, filter, de-dupe; None if nothing left
+        data = self._as_data_dict(contracts_or_data, start, end)
+        if not data:
+            return None
+
         all_df = self._concat_with_expiry(data)
 
-        # Clip
+        # Clip + optional volume filter, as one mask (one copy)
+        keep = np.ones(len(all_df), dtype=bool)
         if start is not None:
-            all_df = all_df[all_df["date"] >= pd.to_datetime(start)]
+            keep &= (all_df["date"] >= pd.to_datetime(start)).to_numpy()
         if end is not None:
-            all_df = all_df[all_df["date"] <= pd.to_datetime(end)]
-        if all_df.empty:
-            empty = self._empty_series_df()
-            return (empty, pd.DataFrame()) if return_segments else empty
-
-        # Optional volume filter
+            keep &= (all_df["date"] <= pd.to_datetime(end)).to_numpy()
+        if not keep.any():
+            return None
         if self.min_volume is not None and "volume" in all_df.columns:
-            all_df = all_df[all_df["volume"] > int(self.min_volume)]
-
-        # De-dupe
-        all_df = all_df.sort_values(["symbol","date"]).drop_duplicates(subset=["symbol","date"], keep="last")
-
-        # Per-date ranking by expiry (earliest first)
-        counts = all_df.groupby("date")["source_symbol"].nunique().rename("active_count")
-        all_df = all_df.merge(counts, on="date", how="left")
-        all_df["rank"] = all_df.groupby("date")["exp_key"].rank(method="first", ascending=True)
+            keep &= (all_df["volume"] > int(self.min_volume)).to_numpy()
+        if not keep.all():
+            all_df = all_df[keep]
+
+        # De-dupe (symbol, date), keeping the last row, on integer keys: contracts
+        # are coded in symbol order so the result comes out sorted by (symbol, date)
+        syms = sorted(data)
+        code = pd.Index(syms).get_indexer(all_df["source_symbol"])
+        order = np.lexsort((all_df["date"].to_numpy(), code))
+        c, dt = code[order], all_df["date"].to_numpy()[order]
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = (c[1:] != c[:-1]) | (dt[1:] != dt[:-1])
+        if last.all() and (order == np.arange(len(order))).all():
+            return all_df
+        return all_df.take(order[last])
+
+    def roll_sweep(
+        self,
+        contracts_or_data: Union[Iterable[str], Dict[str, pd.DataFrame]],
+        rules: Union[Dict[object, Optional[RollRule]], Iterable[Optional[RollRule]]],
+        *,
+        lines: Iterable[int] = (1,),
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> Dict[object, pd.DataFrame]:
+        """
+        Build the same lines under several roll rules (e.g. a days_before grid in a
+        backtest). Contracts are fetched, normalized and sorted once; each rule
+        then only costs its roll dates and one ranking pass.
+        Returns {key: series_df}, keys from a dict of rules or list positions.
+        """
+        if not isinstance(rules, dict):
+            rules = dict(enumerate(rules))
+        lines = sorted(set(int(k) for k in lines))
+        if not lines or lines[0] < 1:
+            raise ValueError("lines must be a non-empty list of integers >= 1")
+
+        all_df = self._prepare_all(contracts_or_data, start, end)
+        if all_df is None:
+            return {key: self._empty_series_df() for key in rules}
+        all_df = all_df.sort_values(["date", "exp_key"], kind="stable").reset_index(drop=True)
+        return {key: self._pick_lines(all_df, lines, roll=rule or ExpiryRoll()) for key, rule in rules.items()}
 
-        # Select nearby-k
-        k = float(line_number)
-        pick = all_df[all_df["rank"] == k].copy()
+    @staticmethod
+    def _apply_roll(all_df: pd.DataFrame, roll: Optional[RollRule],
+                    not_before: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        # Drop every row on or after its contract's roll-out date
+        if roll is None:
+            return all_df
+        out_dt = roll.roll_dates(all_df, not_before)
+        cut = out_dt.reindex(all_df["source_symbol"]).to_numpy(dtype="datetime64[ns]")
+        held = np.isnat(cut) | (all_df["date"].to_numpy(dtype="datetime64[ns]") < cut)
+        return all_df[held]
+
+    def _pick_lines(
+        self,
+        all_df: pd.DataFrame,
+        lines: List[int],
+        roll: Optional[RollRule] = None,
+        adjust: bool = True,
+        not_before: Optional[pd.Timestamp] = None,
+    ) -> pd.DataFrame:
+        all_df = self._apply_roll(all_df, roll if roll is not None else self.roll, not_before)
+
+        # Per-date ranking by expiry (earliest first): one stable sort of the row
+        # order by (date, exp_key), then the rank is the position inside each
+        # date's block. Only the picked rows are ever copied
+        d = all_df["date"].to_numpy()
+        order = np.lexsort((all_df["exp_key"].to_numpy(), d))
+        d = d[order]
+        new_date = np.ones(len(d), dtype=bool)
+        new_date[1:] = d[1:] != d[:-1]
+        starts = np.flatnonzero(new_date)
+        grp = np.cumsum(new_date) - 1
+        rank = np.arange(len(d)) - starts[grp] + 1
+        active_count = np.diff(np.append(starts, len(d)))[grp]
+
+        # Select nearby-k, laid out by (line, date)
+        keep = np.isin(rank, lines)
         if self.drop_incomplete_days:
-            pick = pick[pick["active_count"] >= line_number]
-
-        pick["line"] = line_number
+            keep &= active_count >= rank
+        line = rank[keep]
+        by_line = np.argsort(line, kind="stable")
+        rows = order[keep][by_line]
 
         # Output columns: keep what exists, no synthetic 'value'
-        base_cols = ["date","line","source_symbol","symbol"]
-        price_cols = [c for c in ["open","high","low","close","settlement","last"] if c in pick.columns]
-        other_cols = [c for c in ["volume","openInterest"] if c in pick.columns]
-        out_cols = [c for c in base_cols + price_cols + other_cols if c in pick.columns]
+        base_cols = ["date","source_symbol","symbol"]
+        price_cols = [c for c in ["open","high","low","close","settlement","last"] if c in all_df.columns]
+        other_cols = [c for c in ["volume","openInterest"] if c in all_df.columns]
+        out_cols = [c for c in base_cols + price_cols + other_cols if c in all_df.columns]
+
+        series_df = all_df[out_cols].take(rows).reset_index(drop=True)
+        series_df.insert(1, "line", line[by_line])
+        if self.adjustment is None or not adjust:
+            return series_df
+        return self.adjust_series(series_df, method=self.adjustment, anchor=self.anchor,
+                                  field=self.adjust_field)
 
-        series_df = pick[out_cols].sort_values("date").reset_index(drop=True)
+    # ---------- Roll adjustment ----------
 
-        if not return_segments:
-            return series_df
+    _PRICE_FIELDS = ["open","high","low","close","settlement","last"]
 
-        seg_df = self._segments_from_series(series_df, line_number=line_number)
-        return series_df, seg_df
+    @staticmethod
+    def _roll_adjustments(sym: np.ndarray, px: np.ndarray, method: str, anchor: str) -> np.ndarray:
+        """
+        Per-row adjustment (additive offset or multiplicative factor) of one line,
+        from the segment boundaries (changes of source_symbol): gaps are taken once
+        per roll and spread with a cumulative sum/product, no per-segment loop.
+        """
+        neutral = 0.0 if method == "additive" else 1.0
+        if len(sym) == 0:
+            return np.empty(0)
+        starts, ends, seg = ContinuousFuturesBuilder._runs(sym)
+
+        first, last = px[starts], px[ends]
+        if method == "additive":
+            gaps = np.nan_to_num(first[1:] - last[:-1], nan=0.0)
+            if anchor == "backward":
+                adj = np.append(np.cumsum(gaps[::-1])[::-1], neutral)
+            else:
+                adj = np.append(neutral, -np.cumsum(gaps))
+        else:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ratios = first[1:] / last[:-1]
+            ratios = np.where(np.isfinite(ratios), ratios, 1.0)
+            if anchor == "backward":
+                adj = np.append(np.cumprod(ratios[::-1])[::-1], neutral)
+            else:
+                adj = np.append(neutral, 1.0 / np.cumprod(ratios))
+        return adj[seg]
+
+    @staticmethod
+    def _runs(*keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Run-length encoding: a new run wherever any key changes.
+        # Returns first row, last row of each run, and the run id of every row
+        n = len(keys[0])
+        new_run = np.zeros(n, dtype=bool)
+        new_run[:1] = True
+        for k in keys:
+            new_run[1:] |= k[1:] != k[:-1]
+        starts = np.flatnonzero(new_run)
+        ends = np.append(starts[1:] - 1, n - 1)
+        return starts, ends, np.cumsum(new_run) - 1
+
+    @classmethod
+    def _apply_adjustment(cls, df: pd.DataFrame, adj: np.ndarray, method: str) -> pd.DataFrame:
+        col = "roll_adjustment" if method == "additive" else "roll_factor"
+        df[col] = adj
+        for c in cls._PRICE_FIELDS:
+            if c in df.columns:
+                df[f"{c}_adj"] = df[c] + adj if method == "additive" else df[c] * adj
+        return df
+
+    @classmethod
+    def adjust_series(
+        cls,
+        series_df: pd.DataFrame,
+        *,
+        method: str = "additive",
+        anchor: str = "backward",
+        field: str = "close",
+    ) -> pd.DataFrame:
+        """
+        Back-adjust the output of build()/build_lines(): each line is adjusted on
+        its own, additively ("additive") or multiplicatively ("ratio").
+        """
+        out = series_df.copy()
+        if out.empty:
+            return out
+        adj = np.empty(len(out))
+        line = out["line"].to_numpy() if "line" in out.columns else np.zeros(len(out))
+        sym = out["source_symbol"].to_numpy()
+        px = pd.to_numeric(out[field], errors="coerce").to_numpy(dtype=float)
+        for k in np.unique(line):
+            idx = np.flatnonzero(line == k)
+            idx = idx[np.argsort(out["date"].to_numpy()[idx], kind="stable")]
+            adj[idx] = cls._roll_adjustments(sym[idx], px[idx], method, anchor)
+        return cls._apply_adjustment(out, adj, method)
+
+    @classmethod
+    def extend_adjusted(
+        cls,
+        adjusted_df: pd.DataFrame,
+        new_rows: pd.DataFrame,
+        *,
+        method: str = "additive",
+        anchor: str = "backward",
+        field: str = "close",
+    ) -> pd.DataFrame:
+        """
+        Append raw rows of ONE line (dates after `adjusted_df`) to an already
+        adjusted series without re-deriving history:
+          - no roll in the new rows: history is untouched;
+          - rolls: only the new gaps are measured; backward-anchored history is
+            shifted (or scaled) once by their total, forward-anchored history
+            never moves.
+        """
+        if new_rows is None or new_rows.empty:
+            return adjusted_df
+        if adjusted_df is None or adjusted_df.empty:
+            return cls.adjust_series(new_rows, method=method, anchor=anchor, field=field)
+
+        col = "roll_adjustment" if method == "additive" else "roll_factor"
+        new = new_rows.sort_values("date", kind="stable").reset_index(drop=True)
+
+        # Roll gaps of [last known row] + new rows, anchored like the history
+        sym = np.append(adjusted_df["source_symbol"].to_numpy()[-1:], new["source_symbol"].to_numpy())
+        px = np.append(pd.to_numeric(adjusted_df[field].iloc[-1:], errors="coerce").to_numpy(dtype=float),
+                       pd.to_numeric(new[field], errors="coerce").to_numpy(dtype=float))
+        adj = cls._roll_adjustments(sym, px, method, anchor)
+
+        hist = adjusted_df.copy()
+        if anchor == "backward":
+            # adj[0] is the total of the new gaps: move the whole history once
+            shift = adj[0]
+            if (method == "additive" and shift != 0.0) or (method == "ratio" and shift != 1.0):
+                hist = cls._apply_adjustment(hist, hist[col].to_numpy() + shift if method == "additive"
+                                             else hist[col].to_numpy() * shift, method)
+            new_adj = adj[1:]
+        else:
+            base = hist[col].iloc[-1]
+            new_adj = base + adj[1:] if method == "additive" else base * adj[1:]
+
+        new = cls._apply_adjustment(new, new_adj, method)
+        return pd.concat([hist, new], ignore_index=True)
 
     # ---------- Internals ----------
 
     @staticmethod
     def _generate_symbol_ladder(root: str, cycle_months: List[int], start_dt: pd.Timestamp, end_dt: pd.Timestamp) -> List[str]:
-        month_set = set(cycle_months)
-        symbols: List[str] = []
-        seen: set[str] = set()
-        for dt in pd.date_range(start_dt, end_dt, freq="MS"):   # month starts within window
-            if dt.month in month_set:
-                sym = f"{root}{_MONTH_CODE_INV[dt.month]}{dt.year%100:02d}"
-                if sym not in seen:
-                    symbols.append(sym); seen.add(sym)
-        return symbols
+        return contract_calendar(root, tuple(cycle_months)).ladder(start_dt, end_dt)
 
     @staticmethod
     def _front_symbol_at_date(root: str, cycle_months: List[int], date_dt: pd.Timestamp) -> str:
@@ -280,16 +1413,8 @@ class ContinuousFuturesBuilder:
         Compute which contract month would be 'front' around a calendar date,
         assuming roll to the *next cycle month* after the last one in/before `date_dt`.
         """
-        y = date_dt.year
-        m = date_dt.month
-        after_or_equal = [cm for cm in sorted(cycle_months) if cm >= m]
-        if after_or_equal:
-            front_m = after_or_equal[0]
-            front_y = y
-        else:
-            front_m = sorted(cycle_months)[0]
-            front_y = y + 1
-        return f"{root}{_MONTH_CODE_INV[front_m]}{front_y%100:02d}"
+        cal = contract_calendar(root, tuple(cycle_months))
+        return cal.symbol(cal.first_on_or_after(date_dt))
 
     @staticmethod
     def _steps_forward(from_sym: str, to_sym: str, cycle_months: List[int]) -> int:
@@ -297,19 +1422,13 @@ class ContinuousFuturesBuilder:
         Non-negative steps from `from_sym` to `to_sym` along the cycle.
         If `to_sym` is not ahead, returns 0.
         """
-        from_key = expiry_key(from_sym)
-        to_key = expiry_key(to_sym)
-        if to_key <= from_key:
+        if expiry_key(to_sym) <= expiry_key(from_sym):
             return 0
-        steps = 0
-        cur = from_sym
-        # cycles are short; a small safe cap avoids accidental loops
-        for _ in range(48):
-            if cur == to_sym:
-                return steps
-            cur = step_symbol(cur, 1, cycle_months)
-            steps += 1
-        raise RuntimeError(f"Could not reach {to_sym} from {from_sym} with cycle {cycle_months}")
+        cal = contract_calendar(parse_symbol(from_sym)[0], tuple(cycle_months))
+        try:
+            return cal.distance(from_sym, to_sym)
+        except ValueError:
+            raise RuntimeError(f"Could not reach {to_sym} from {from_sym} with cycle {cycle_months}") from None
 
     def _as_data_dict(
         self,
@@ -320,7 +1439,7 @@ class ContinuousFuturesBuilder:
         if isinstance(contracts_or_data, dict):
             data: Dict[str, pd.DataFrame] = {}
             for sym, df in contracts_or_data.items():
-                n = self._normalize_contract_df(df, sym)
+                n = self._normalize_contract_df(df, sym, start, end)
                 if not n.empty:
                     data[sym] = n
             if not data and self.verbose:
@@ -331,111 +1450,163 @@ class ContinuousFuturesBuilder:
             raise ValueError("No fetcher provided. Pass a dict, or initialize with a fetcher.")
 
         symbols = sorted(set(contracts_or_data), key=expiry_key)
-        out: Dict[str, pd.DataFrame] = {}
-        for sym in symbols:
+
+        def fetch(sym: str) -> Optional[pd.DataFrame]:
             if self.verbose:
                 print(f"Downloading {sym}…")
-            df = self.fetcher.fetch_one(sym, start, end)
+            return self.fetcher.fetch_one(sym, start, end)
+
+        if self.max_workers > 1 and len(symbols) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                fetched = list(pool.map(fetch, symbols))
+        else:
+            fetched = [fetch(sym) for sym in symbols]
+
+        out: Dict[str, pd.DataFrame] = {}
+        for sym, df in zip(symbols, fetched):
             if df is None or len(df) == 0:
                 if self.verbose:
                     print(f"Skipping {sym} — empty fetch.")
                 continue
-            n = self._normalize_contract_df(df, sym)
+            n = self._normalize_contract_df(df, sym, start, end)
             if not n.empty:
                 out[sym] = n
             elif self.verbose:
                 print(f"Skipping {sym} — empty after normalization.")
+
+        if self.verbose and hasattr(self.fetcher, "stats"):
+            st = self.fetcher.stats()
+            print(f"Cache: hit ratio {st['hit_ratio']:.0%} "
+                  f"({st['hits']} hits, {st['partial']} top-ups, {st['misses']} misses), "
+                  f"~{st['bytes_saved'] / 1e6:.2f} MB not downloaded.")
         return out
 
     @staticmethod
     def _to_naive_datetime(s: pd.Series) -> pd.Series:
+        # Already naive datetimes pass through untouched; tz-aware ones are
+        # converted to UTC-naive; anything else is parsed as before
+        if isinstance(s.dtype, pd.DatetimeTZDtype):
+            return s.dt.tz_convert(None)
+        if pd.api.types.is_datetime64_dtype(s.dtype):
+            return s
         return pd.to_datetime(s, utc=True, errors="coerce").dt.tz_convert(None)
 
-    def _normalize_contract_df(self, df: pd.DataFrame, symbol: str) -> pd.DataFrame:
-        out = df.copy()
-
-        # date
-        date_col = next((c for c in ("date","tradeDate","timestamp","Date") if c in out.columns), None)
+    # Output field -> accepted input column names (case-insensitive), first match wins
+    _NUMERIC_FIELDS = {
+        "open": ("open",),
+        "high": ("high",),
+        "low": ("low",),
+        "close": ("close", "last"),
+        "settlement": ("settlement", "settle", "set", "sett"),
+        "last": ("last",),
+        "volume": ("volume", "vol"),
+        "openInterest": ("openinterest", "open_interest", "oi"),
+    }
+
+    def _normalize_contract_df(
+        self,
+        df: pd.DataFrame,
+        symbol: str,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> pd.DataFrame:
+        # Select, rename and clip to [start, end] straight from the input: no
+        # up-front copy, each kept column is materialized once. 'symbol',
+        # 'source_symbol' and 'exp_key' are added once, in _concat_with_expiry
+        date_col = next((c for c in ("date","tradeDate","timestamp","Date") if c in df.columns), None)
         if date_col is None:
             raise KeyError("No date-like column found (expected one of: date, tradeDate, timestamp, Date).")
-        out["date"] = self._to_naive_datetime(out[date_col])
-        out = out[out["date"].notna()]
 
         # lower-case mapping for flexible renames
-        lower = {c.lower(): c for c in out.columns}
+        lower = {c.lower(): c for c in df.columns}
         def pull(*aliases: str) -> Optional[str]:
             for a in aliases:
                 if a in lower:
                     return lower[a]
             return None
 
-        OPEN  = pull("open")
-        HIGH  = pull("high")
-        LOW   = pull("low")
-        CLOSE = pull("close","last")
-        SETTL = pull("settlement","settle","set","sett")
-        LAST  = pull("last")
-        VOL   = pull("volume","vol")
-        OI    = pull("openinterest","open_interest","oi")
+        fields = [(dst, pull(*aliases)) for dst, aliases in self._NUMERIC_FIELDS.items()]
 
-        cols = ["date", "symbol"]
-        out["symbol"] = symbol
-
-        rename_map = {}
-        for src, dst in [(OPEN,"open"), (HIGH,"high"), (LOW,"low"),
-                         (CLOSE,"close"), (SETTL,"settlement"), (LAST,"last"),
-                         (VOL,"volume"), (OI,"openinterest")]:
-            if src:
-                rename_map[src] = dst
-                cols.append(src)
-
-        out = out[cols].rename(columns=rename_map)
+        dates = self._to_naive_datetime(df[date_col]).to_numpy()
+        keep = ~np.isnat(dates)
+        if start is not None:
+            keep &= dates >= pd.Timestamp(start).to_datetime64()
+        if end is not None:
+            keep &= dates <= pd.Timestamp(end).to_datetime64()
+        rows = None if keep.all() else np.flatnonzero(keep)
 
-        # numeric coercion
-        for c in ["open","high","low","close","settlement","last","volume","openinterest"]:
-            if c in out.columns:
-                out[c] = pd.to_numeric(out[c], errors="coerce")
+        def take(v: np.ndarray) -> np.ndarray:
+            return v if rows is None else v[rows]
 
-        if "openinterest" in out.columns:
-            out = out.rename(columns={"openinterest":"openInterest"})
+        cols = {"date": take(dates)}
+        for dst, src in fields:
+            if src is not None:
+                col = df[src]
+                if not pd.api.types.is_numeric_dtype(col.dtype):
+                    col = pd.to_numeric(col, errors="coerce")
+                cols[dst] = take(col.to_numpy())
+        out = pd.DataFrame(cols, copy=False)
 
-        return out.sort_values("date").dropna(subset=["date"]).reset_index(drop=True)
+        if not out["date"].is_monotonic_increasing:
+            out = out.sort_values("date", kind="stable")
+        return out.reset_index(drop=True)
 
     @staticmethod
     def _concat_with_expiry(data: Dict[str, pd.DataFrame]) -> pd.DataFrame:
-        frames = []
-        for sym, df in data.items():
-            ek = expiry_key(sym)
-            f = df.copy()
-            f["source_symbol"] = sym
-            f["exp_key"] = ek
-            frames.append(f)
-        return pd.concat(frames, ignore_index=True)
+        # One concat, in symbol order; symbol columns and expiry keys are
+        # broadcast from the dict keys
+        syms = sorted(data)
+        out = pd.concat([data[s] for s in syms], ignore_index=True)
+        sizes = [len(data[s]) for s in syms]
+        sym_col = np.repeat(np.array(syms, dtype=object), sizes)
+        out.insert(1, "symbol", sym_col)
+        out["source_symbol"] = sym_col
+        out["exp_key"] = np.repeat(parse_symbols(syms)["exp_key"].to_numpy(), sizes)
+        return out
+
+    @staticmethod
+    def _segments_from_series(series_df: pd.DataFrame, *, line_number: int, field: str = "close") -> pd.DataFrame:
+        """
+        Segment table (see _SEGMENT_DTYPES) in one pass: runs of (line, source_symbol) over
+        a series sorted by line then date. Roll gaps use `field` prices and match
+        the adjustments: a backward additive adjustment of a segment is the sum of
+        its own and later roll_gap values on the line (product of roll_ratio).
+        """
+        if series_df.empty:
+            return ContinuousFuturesBuilder._empty_segments_df()
+
+        sym = series_df["source_symbol"].to_numpy()
+        line = series_df["line"].to_numpy() if "line" in series_df.columns else np.full(len(sym), line_number)
+        dates = series_df["date"].to_numpy(dtype="datetime64[ns]")
+        starts, ends, _ = ContinuousFuturesBuilder._runs(line, sym)
+
+        if field in series_df.columns:
+            px = pd.to_numeric(series_df[field], errors="coerce").to_numpy(dtype=float)
+        else:
+            px = np.full(len(sym), np.nan)
+
+        # Roll into the next run only when it is on the same line
+        nxt = np.append(starts[1:], 0)
+        has_next = np.append(line[starts[1:]] == line[starts[:-1]], False)
+        roll_date = np.where(has_next, dates[nxt], np.datetime64("NaT", "ns"))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            roll_gap = np.where(has_next, px[nxt] - px[ends], np.nan)
+            roll_ratio = np.where(has_next, px[nxt] / px[ends], np.nan)
+
+        return pd.DataFrame({
+            "segment_start": dates[starts].astype("datetime64[D]").astype("datetime64[ns]"),
+            "segment_end": dates[ends].astype("datetime64[D]").astype("datetime64[ns]"),
+            "line": line[starts].astype(np.int64),
+            "source_symbol": sym[starts].astype(object),
+            "n_rows": (ends - starts + 1).astype(np.int64),
+            "roll_date": roll_date,
+            "roll_gap": roll_gap,
+            "roll_ratio": roll_ratio,
+        })
 
     @staticmethod
-    def _segments_from_series(series_df: pd.DataFrame, *, line_number: int) -> pd.DataFrame:
-        rows: List[Segment] = []
-        if not series_df.empty:
-            s = series_df.copy()
-            s["prev_sym"] = s["source_symbol"].shift()
-            bounds = s.index[(s["source_symbol"] != s["prev_sym"])].tolist() + [len(s)]
-            i = 0
-            for j in bounds:
-                if i == j:
-                    i = j
-                    continue
-                chunk = s.iloc[i:j]
-                rows.append(
-                    Segment(
-                        segment_start=chunk["date"].min().normalize(),
-                        segment_end=chunk["date"].max().normalize(),
-                        line=series_df["line"].iat[0],
-                        source_symbol=chunk["source_symbol"].iat[0],
-                        n_rows=len(chunk),
-                    )
-                )
-                i = j
-        return pd.DataFrame([r.__dict__ for r in rows])
+    def _empty_segments_df() -> pd.DataFrame:
+        return pd.DataFrame({c: pd.Series(dtype=t) for c, t in _SEGMENT_DTYPES.items()})
 
     @staticmethod
     def _empty_series_df() -> pd.DataFrame:
@@ -444,3 +1615,135 @@ class ContinuousFuturesBuilder:
             "open","high","low","close","settlement","last",
             "volume","openInterest"
         ])
+
+
+# ==============================
+# Curve engine
+# ==============================
+
+class FuturesCurve:
+    """
+    Forward-curve analytics of one root over a date x contract price matrix
+    (contracts in expiry order, NaN where a contract has no price). Every row is
+    compressed once to its listed contracts, nearest first; all outputs are then
+    whole-array operations:
+      - curve():             date x tenor prices (tenor 1 = nearest listed contract)
+      - constant_maturity(): prices interpolated at fixed days to expiry
+      - spreads():           nearby spreads, e.g. 1-2 and 1-3 (near minus far)
+      - roll_yield():        annualized log slope between two tenors
+      - panel():             all of the above side by side
+
+    `expiries` (symbol -> expiry date) drives days to expiry. Missing contracts use
+    their last row when they stopped trading before the last date, else the 15th
+    of the delivery month.
+    """
+    def __init__(self, dates: pd.DatetimeIndex, symbols: Iterable[str], prices: np.ndarray, expiries: np.ndarray):
+        self.dates = pd.DatetimeIndex(dates)
+        self.symbols = np.asarray(list(symbols), dtype=object)
+        self.prices = np.asarray(prices, dtype=float)
+        self.expiries = np.asarray(expiries, dtype="datetime64[ns]")
+
+        listed = ~np.isnan(self.prices)
+        self.n_listed = listed.sum(axis=1)
+        width = int(self.n_listed.max()) if len(self.n_listed) else 0
+        self._order = np.argsort(~listed, axis=1, kind="stable")[:, :width]
+        self._curve = np.take_along_axis(self.prices, self._order, axis=1)
+        dte = (self.expiries[None, :] - self.dates.values[:, None]) / np.timedelta64(1, "D")
+        self._dte = np.take_along_axis(np.where(listed, dte, np.nan), self._order, axis=1)
+
+    @classmethod
+    def from_frame(cls, all_df: pd.DataFrame, *, field: str = "close",
+                   expiries: Optional[pd.Series] = None) -> "FuturesCurve":
+        """From stacked contracts (ContinuousFuturesBuilder._prepare_all output)."""
+        dates, syms, prices = _contract_matrix(all_df, field)
+
+        parts = parse_symbols(pd.Series(syms, dtype=object))
+        mid_month = pd.to_datetime(pd.DataFrame({"year": parts["year"], "month": parts["month"], "day": 15}))
+        last_row = all_df.groupby("source_symbol", sort=False)["date"].max().reindex(syms)
+        default = np.where(last_row.to_numpy() < dates[-1].to_datetime64(), last_row.to_numpy(), mid_month.to_numpy())
+        exp = pd.Series(default, index=syms, dtype="datetime64[ns]")
+        if expiries is not None:
+            given = pd.to_datetime(expiries.reindex(syms), errors="coerce")
+            exp = given.fillna(exp)
+        return cls(dates, syms, prices, exp.to_numpy())
+
+    def curve(self, max_tenor: Optional[int] = None) -> pd.DataFrame:
+        """Date x tenor prices; tenor k is the k-th nearest contract listed that day."""
+        k = self._curve.shape[1] if max_tenor is None else min(max_tenor, self._curve.shape[1])
+        return pd.DataFrame(self._curve[:, :k], index=self.dates,
+                            columns=pd.RangeIndex(1, k + 1, name="tenor"))
+
+    def curve_symbols(self, max_tenor: Optional[int] = None) -> pd.DataFrame:
+        """Contract behind every cell of curve()."""
+        k = self._curve.shape[1] if max_tenor is None else min(max_tenor, self._curve.shape[1])
+        syms = self.symbols[self._order[:, :k]]
+        syms[np.isnan(self._curve[:, :k])] = None
+        return pd.DataFrame(syms, index=self.dates, columns=pd.RangeIndex(1, k + 1, name="tenor"))
+
+    def constant_maturity(self, days: Iterable[int] = (30, 90, 180, 365), log: bool = False) -> pd.DataFrame:
+        """
+        Prices at fixed days to expiry, interpolated between the two listed contracts
+        around each maturity (linear in price, or in log price with log=True).
+        NaN when the maturity is not bracketed by that day's curve.
+        """
+        days = [int(t) for t in days]
+        rows = np.arange(len(self.dates))
+        px = np.log(self._curve) if log else self._curve
+        dte = self._dte
+        out = np.full((len(self.dates), len(days)), np.nan)
+        if dte.shape[1] == 0:
+            return pd.DataFrame(out, index=self.dates, columns=pd.Index(days, name="days"))
+
+        for j, t in enumerate(days):
+            lo = (dte <= t).sum(axis=1) - 1           # last listed contract at or before t
+            hi = lo + 1
+            ok = (lo >= 0) & (hi < self.n_listed)
+            lo_c, hi_c = np.clip(lo, 0, dte.shape[1] - 1), np.clip(hi, 0, dte.shape[1] - 1)
+            d_lo, d_hi = dte[rows, lo_c], dte[rows, hi_c]
+            p_lo, p_hi = px[rows, lo_c], px[rows, hi_c]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                val = p_lo + (t - d_lo) / (d_hi - d_lo) * (p_hi - p_lo)
+            exact = (lo >= 0) & (d_lo == t)
+            out[:, j] = np.where(exact, p_lo, np.where(ok, val, np.nan))
+
+        if log:
+            out = np.exp(out)
+        return pd.DataFrame(out, index=self.dates, columns=pd.Index(days, name="days"))
+
+    def _tenor(self, k: int) -> np.ndarray:
+        if k < 1:
+            raise ValueError("tenors start at 1")
+        if k > self._curve.shape[1]:
+            return np.full(len(self.dates), np.nan)
+        return self._curve[:, k - 1]
+
+    def spreads(self, pairs: Iterable[Tuple[int, int]] = ((1, 2), (1, 3))) -> pd.DataFrame:
+        """Nearby spreads, near minus far: column '1-2' is tenor 1 - tenor 2."""
+        return pd.DataFrame({f"{a}-{b}": self._tenor(a) - self._tenor(b) for a, b in pairs},
+                            index=self.dates)
+
+    def roll_yield(self, near: int = 1, far: int = 2) -> pd.Series:
+        """
+        Annualized roll yield between two tenors: ln(P_near / P_far) * 365 / (days
+        between their expiries). Positive in backwardation.
+        """
+        dte = lambda k: self._dte[:, k - 1] if k <= self._dte.shape[1] else np.full(len(self.dates), np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ry = np.log(self._tenor(near) / self._tenor(far)) * 365.0 / (dte(far) - dte(near))
+        return pd.Series(ry, index=self.dates, name=f"roll_yield_{near}_{far}")
+
+    def panel(
+        self,
+        tenors: int = 6,
+        maturities: Iterable[int] = (30, 90, 180, 365),
+        pairs: Iterable[Tuple[int, int]] = ((1, 2), (1, 3)),
+    ) -> pd.DataFrame:
+        """curve, constant_maturity, spreads and roll_yield side by side (two-level columns)."""
+        pairs = list(pairs)
+        ry = pd.DataFrame({f"{a}-{b}": self.roll_yield(a, b).to_numpy() for a, b in pairs}, index=self.dates)
+        return pd.concat({
+            "tenor": self.curve(tenors),
+            "cm": self.constant_maturity(maturities),
+            "spread": self.spreads(pairs),
+            "roll_yield": ry,
+        }, axis=1)
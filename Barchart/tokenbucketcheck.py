@@ -0,0 +1,111 @@
+# tokenbucketcheck.py
+# ET Nov25
+
+"""
+Throughput check of the TokenBucket limiter against a local stub of the Barchart
+queryeod endpoint (no network access needed):
+
+    python tokenbucketcheck.py --rate 5 --burst 2 --workers 8 --contracts 30
+
+A BarchartHistoricalData client is pointed at the stub, and a
+ContinuousFuturesBuilder fetches `contracts` symbols through `workers` threads
+sharing one TokenBucket. The stub records the arrival time of every request; the
+check fails (AssertionError) if more than rate + burst requests arrive in any
+1 s window, or if the sustained rate exceeds `rate`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import barcharthistoricaldata as bhd
+from futurescontinuoustimeseriesbuilder import (
+    BarchartFetcher, ContinuousFuturesBuilder, TokenBucket, contract_calendar,
+)
+
+
+def _stub_server(latency: float) -> tuple[ThreadingHTTPServer, list[float]]:
+    # Root page sets the XSRF cookie; queryeod answers a few CSV rows per symbol
+    arrivals: list[float] = []
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            if not url.path.endswith("queryeod.ashx"):
+                self.send_response(200)
+                self.send_header("Set-Cookie", "XSRF-TOKEN=stub; Path=/")
+                self.end_headers()
+                return
+
+            with lock:
+                arrivals.append(time.monotonic())
+            time.sleep(latency)
+            sym = urllib.parse.parse_qs(url.query)["symbol"][0]
+            body = "".join(f"{sym},2020-01-{d:02d},1.0,1.0,1.0,1.0,10,100\n" for d in range(2, 9))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, arrivals
+
+
+def check(rate: float, burst: int, workers: int, contracts: int, latency: float) -> float:
+    """Run the check, return the measured requests per second."""
+    server, arrivals = _stub_server(latency)
+    bhd.ROOT = f"http://127.0.0.1:{server.server_port}"
+    bhd.API_EOD = f"{bhd.ROOT}/proxies/timeseries/historical/queryeod.ashx"
+    try:
+        client = bhd.BarchartHistoricalData(pool_maxsize=workers)
+        fetcher = BarchartFetcher(client, limiter=TokenBucket(rate, burst))
+        builder = ContinuousFuturesBuilder(fetcher, max_workers=workers, verbose=False)
+        symbols = contract_calendar("KC", (3, 5, 7, 9, 12)).symbols[200:200 + contracts]
+
+        t0 = time.monotonic()
+        data = builder._as_data_dict(symbols, None, None)
+        elapsed = time.monotonic() - t0
+    finally:
+        server.shutdown()
+
+    assert len(data) == contracts, f"{len(data)} of {contracts} contracts fetched"
+    t = np.sort(np.asarray(arrivals))
+    assert len(t) == contracts, f"{len(t)} requests for {contracts} contracts"
+
+    # Any 1 s window: at most the burst plus one second of refill
+    in_window = np.searchsorted(t, t + 1.0, side="left") - np.arange(len(t))
+    worst = int(in_window.max())
+    assert worst <= rate + burst, f"{worst} requests in 1 s > rate + burst = {rate + burst}"
+
+    # Sustained rate once the initial burst is spent (5% slack for timer jitter)
+    if len(t) > burst + 1:
+        sustained = (len(t) - burst) / (t[-1] - t[0])
+        assert sustained <= rate * 1.05, f"sustained {sustained:.2f} req/s > rate {rate}"
+
+    rps = contracts / elapsed
+    print(f"rate={rate} burst={burst} workers={workers}: {contracts} requests in {elapsed:.2f}s "
+          f"({rps:.2f} req/s), max {worst} in any 1 s window - OK")
+    return rps
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--rate", type=float, default=5.0)
+    p.add_argument("--burst", type=int, default=2)
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--contracts", type=int, default=30)
+    p.add_argument("--latency", type=float, default=0.1, help="stub response delay, seconds")
+    a = p.parse_args()
+    check(a.rate, a.burst, a.workers, a.contracts, a.latency)
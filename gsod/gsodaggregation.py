@@ -0,0 +1,134 @@
+# """ gsodaggregation.py """
+
+import numpy as np
+import pandas as pd
+
+
+class RegionalAggregator(object):
+    '''
+    Aggregate daily station data (the output of GSOD.get_data/get_bulk_data) to
+    regional daily series with configurable station weights
+
+    Each attribute is laid out as a station x date float32 array, block of dates by
+    block of dates, and all regions are computed at once as weight-matrix products:
+        value = W @ x / W @ mask     ('mean', weights renormalized on reporting stations)
+        value = W @ x                ('sum')
+    Missing observations are masked out natively, so nothing is filled or dropped
+    per station, and memory is bounded by n_stations x block_days
+
+    Parameters
+    ----------
+    weights : pd.Series, pd.DataFrame or None
+        None gives every station weight 1 in a single region 'all'. A Series indexed by
+        station id is one region named after the Series (or 'all'). A DataFrame with
+        columns 'region', 'station_id', 'weight' defines several regions (a station may
+        belong to several regions)
+    min_coverage : float
+        Minimum share of a region's total weight reporting on a date, below which the
+        regional value is NaN
+    block_days : int
+        Number of dates held in memory at once
+    '''
+
+    def __init__(self, weights=None, min_coverage=0.0, block_days=1830):
+        self.weights = weights
+        self.min_coverage = min_coverage
+        self.block_days = block_days
+
+    def _weightMatrix(self, stations):
+        # (n_regions, n_stations) dense weight matrix aligned on 'stations'
+        w = self.weights
+        if w is None:
+            return ['all'], np.ones((1, len(stations)))
+        if isinstance(w, pd.Series):
+            w = pd.DataFrame({'region' : w.name or 'all', 'station_id' : w.index, 'weight' : w.values})
+
+        w = w.groupby(['region', 'station_id'], sort=False)['weight'].sum().unstack('station_id')
+        w = w.reindex(columns=stations).fillna(0.0)
+        return list(w.index), w.to_numpy(dtype=np.float64)
+
+    def aggregate(self, df, attributes, how='mean', date_col='timestamp', station_col='station_id'):
+        '''
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Long daily frame with one row per station and date
+        attributes : str or list
+            Numeric columns to aggregate ('mean_tmp', 'prcp', ...)
+        how : str or dict
+            'mean' or 'sum', or a dict attribute -> 'mean'/'sum'
+
+        Returns
+        -------
+        pd.DataFrame
+            Long frame with columns timestamp, region, attribute, value, n_stations, coverage
+        '''
+        if isinstance(attributes, str):
+            attributes = [attributes]
+        if isinstance(how, str):
+            how = {attr : how for attr in attributes}
+
+        if df.empty:
+            return pd.DataFrame(columns=['timestamp', 'region', 'attribute', 'value', 'n_stations', 'coverage'])
+
+        # Integer coordinates of every row in the station x date grid
+        st_codes, stations = pd.factorize(df[station_col], sort=True)
+        st_codes = st_codes.astype(np.int32)
+        dates = pd.to_datetime(df[date_col]).values.astype('datetime64[D]')
+        first = dates.min()
+        d_codes = (dates - first).astype(np.int32)
+        del dates
+        n_days = int(d_codes.max()) + 1
+
+        regions, W = self._weightMatrix(stations)
+        total_w = W.sum(axis=1, keepdims=True)
+        member = (W > 0).astype(np.float32)
+
+        values = {attr : df[attr].to_numpy(dtype=np.float32) for attr in attributes}
+
+        out = []
+        for b0 in range(0, n_days, self.block_days):
+            b1 = min(b0 + self.block_days, n_days)
+            idx = np.flatnonzero((d_codes >= b0) & (d_codes < b1))
+            rows, cols = st_codes[idx], d_codes[idx] - b0
+
+            block_dates = first + np.arange(b0, b1)
+            for attr in attributes:
+                x = np.zeros((len(stations), b1 - b0), dtype=np.float32)
+                mask = np.zeros_like(x)
+                v = values[attr][idx]
+                ok = np.isfinite(v)
+                x[rows[ok], cols[ok]] = v[ok]
+                mask[rows[ok], cols[ok]] = 1.0
+
+                num = W @ x
+                den = W @ mask
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    value = num / den if how.get(attr, 'mean') == 'mean' else num
+                    coverage = den / total_w
+                value = np.where((den > 0) & (coverage >= self.min_coverage), value, np.nan)
+
+                out.append(pd.DataFrame({'timestamp' : np.tile(block_dates, len(regions)),
+                                         'region' : np.repeat(regions, b1 - b0),
+                                         'attribute' : attr,
+                                         'value' : value.ravel(),
+                                         'n_stations' : (member @ mask).ravel().astype(np.int32),
+                                         'coverage' : coverage.ravel()}))
+
+        df_out = pd.concat(out, ignore_index=True)
+        df_out['timestamp'] = pd.to_datetime(df_out['timestamp'])
+        return df_out.sort_values(['attribute', 'region', 'timestamp'], kind='stable').reset_index(drop=True)
+
+
+'''
+# Example
+if __name__ == "__main__":
+    # Corn-belt daily temperature and rainfall, Iowa stations weighted by planted area
+    from gsodscrapper import GSOD
+    gsod = GSOD(state='IA', start='2015-01-01')
+    stns = gsod.getAvailableWxStations().STATION_ID.tolist()
+    df = gsod.get_bulk_data(stns, 2015, 2020)
+    weights = pd.Series(1.0, index=stns, name='IA') # Replace by county acreage shares
+    agg = RegionalAggregator(weights, min_coverage=0.5)
+    print(agg.aggregate(df, ['mean_tmp', 'prcp'], how={'mean_tmp' : 'mean', 'prcp' : 'sum'}).head())
+'''
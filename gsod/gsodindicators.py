@@ -0,0 +1,194 @@
+# """ gsodindicators.py """
+
+import numpy as np
+import pandas as pd
+
+
+def _cumsum_dates(arr):
+    # In-place running sum down the date axis. A loop of row-wide vector adds beats
+    # np.cumsum(axis=0) on (n_dates, n_stations) arrays by a factor of 2-3
+    for i in range(1, len(arr)):
+        np.add(arr[i], arr[i - 1], out=arr[i])
+    return arr
+
+
+class WeatherIndicators(object):
+    '''
+    Agronomic indicators computed in bulk over date x station panels built from
+    GSOD daily data (the output of GSOD.get_data/get_bulk_data)
+
+    Every panel is a float32 array of shape (n_dates, n_stations) on a complete daily
+    calendar, NaN where a station did not report. Indicators are whole-array NumPy
+    operations, so all stations are processed in a single pass
+
+    Temperatures are in degrees Fahrenheit and precipitation in inches, as delivered
+    by NOAA (see the unit conversion left commented out in GSOD._dataCleanerConverter)
+
+    Parameters
+    ----------
+    dates : pd.DatetimeIndex
+        Daily calendar, one row of the panels per date
+    stations : pd.Index
+        Station ids, one column of the panels per station
+    panels : np.ndarray
+        Named (n_dates, n_stations) arrays, e.g. max_tmp=..., min_tmp=..., prcp=...
+    '''
+
+    def __init__(self, dates, stations, **panels):
+        self.dates = pd.DatetimeIndex(dates)
+        self.stations = pd.Index(stations)
+        self.panels = {k : np.asarray(v, dtype=np.float32) for k, v in panels.items()}
+
+    @classmethod
+    def from_gsod(cls, df, columns=('max_tmp', 'min_tmp', 'mean_tmp', 'prcp'),
+                  date_col='timestamp', station_col='station_id'):
+        '''
+        Scatter a long GSOD frame into date x station panels, one per column
+        '''
+        st_codes, stations = pd.factorize(df[station_col], sort=True)
+        days = pd.to_datetime(df[date_col]).values.astype('datetime64[D]')
+        first, last = days.min(), days.max()
+        d_codes = (days - first).astype(np.int64)
+        dates = pd.date_range(first, last, freq='D')
+
+        panels = {}
+        for col in columns:
+            arr = np.full((len(dates), len(stations)), np.nan, dtype=np.float32)
+            arr[d_codes, st_codes] = df[col].to_numpy(dtype=np.float32)
+            panels[col] = arr
+
+        return cls(dates, stations, **panels)
+
+    def frame(self, arr):
+        '''
+        Wrap a (n_dates, n_stations) result as a date x station DataFrame
+        '''
+        return pd.DataFrame(arr, index=self.dates, columns=self.stations)
+
+    def _start_mask(self, start):
+        # True from each station's start date onwards. 'start' is a date for all
+        # stations or a Series of dates indexed by station id
+        if start is None:
+            return None
+        if isinstance(start, pd.Series):
+            start = pd.to_datetime(start.reindex(self.stations)).values
+        else:
+            start = np.repeat(np.datetime64(pd.Timestamp(start), 'ns'), len(self.stations))
+        pos = self.dates.values.astype('datetime64[ns]').searchsorted(start)
+        pos[pd.isnull(start)] = len(self.dates)
+        return np.arange(len(self.dates))[:, None] >= pos[None, :]
+
+    def _accumulate(self, arr, start=None):
+        # Running total from 'start', missing days count as 0, NaN before start
+        mask = self._start_mask(start)
+        filled = np.where(np.isnan(arr), np.float32(0), arr)
+        if mask is not None:
+            filled[~mask] = 0
+        out = _cumsum_dates(filled)
+        if mask is not None:
+            out[~mask] = np.nan
+        return out
+
+    def gdd(self, base=50.0, cap=86.0, cumulative=False, start=None):
+        '''
+        Growing degree days, modified 86/50 method: daily max and min temperatures
+        are clipped to [base, cap] before averaging. With cumulative=True the running
+        sum from 'start' (date or per-station Series, e.g. planting dates)
+        '''
+        tmax = np.clip(self.panels['max_tmp'], base, cap)
+        tmin = np.clip(self.panels['min_tmp'], base, cap)
+        out = (tmax + tmin) / 2 - np.float32(base)
+        del tmax, tmin
+        return self._accumulate(out, start) if cumulative else out
+
+    def cumulative_prcp(self, start=None):
+        '''
+        Precipitation accumulated since 'start' (date or per-station Series of planting dates)
+        '''
+        return self._accumulate(self.panels['prcp'], start)
+
+    def _threshold_days(self, column, threshold, above, cumulative, start):
+        arr = self.panels[column]
+        hit = (arr >= threshold) if above else (arr <= threshold)
+        out = hit.astype(np.float32)
+        out[np.isnan(arr)] = np.nan
+        return self._accumulate(out, start) if cumulative else out
+
+    def heat_stress_days(self, threshold=95.0, cumulative=False, start=None):
+        '''
+        1 on days with a max temperature at or above 'threshold', 0 otherwise
+        '''
+        return self._threshold_days('max_tmp', threshold, True, cumulative, start)
+
+    def frost_days(self, threshold=32.0, cumulative=False, start=None):
+        '''
+        1 on days with a min temperature at or below 'threshold', 0 otherwise
+        '''
+        return self._threshold_days('min_tmp', threshold, False, cumulative, start)
+
+    def climatology(self, column='mean_tmp'):
+        '''
+        Day-of-year station climatology, shape (366, n_stations). Feb 29 shares Feb 28's slot
+        '''
+        arr = self.panels[column]
+        doy = self._doy()
+        total = np.zeros((366, arr.shape[1]), dtype=np.float64)
+        count = np.zeros((366, arr.shape[1]), dtype=np.int32)
+
+        # Runs of strictly increasing day-of-year (a year, or a leap year split at Feb 29)
+        # hold no duplicate index, so fancy-index adds are safe
+        bounds = np.r_[0, np.flatnonzero(np.diff(doy) <= 0) + 1, len(doy)]
+        for b0, b1 in zip(bounds[:-1], bounds[1:]):
+            sl = slice(b0, b1)
+            chunk = arr[sl]
+            ok = ~np.isnan(chunk)
+            total[doy[sl]] += np.where(ok, chunk, 0)
+            count[doy[sl]] += ok
+
+        with np.errstate(invalid='ignore'):
+            return (total / count).astype(np.float32)
+
+    def _doy(self):
+        # 0-based day of year on a 365-day calendar (Feb 29 -> Feb 28)
+        doy = self.dates.dayofyear.values - 1
+        leap = self.dates.is_leap_year
+        return np.where(leap & (doy >= 59), doy - 1, doy)
+
+    def anomaly(self, column='mean_tmp', window=30, min_periods=None):
+        '''
+        Rolling mean over 'window' days of the departure from the station's
+        day-of-year climatology. NaN-aware through cumulative sums along the dates
+        '''
+        min_periods = min_periods or max(window // 2, 1)
+        arr = self.panels[column]
+        clim = self.climatology(column)[self._doy()]
+        out = np.empty_like(arr)
+
+        # Blocks of stations keep the float64 running sums small in memory
+        for c0 in range(0, arr.shape[1], 1024):
+            cols = slice(c0, c0 + 1024)
+            dev = arr[:, cols] - clim[:, cols]
+            ok = ~np.isnan(dev)
+            csum = _cumsum_dates(np.where(ok, dev, 0).astype(np.float64))
+            ccnt = _cumsum_dates(ok.astype(np.int32))
+            csum[window:] -= csum[:-window]
+            ccnt[window:] -= ccnt[:-window]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                block = csum / ccnt
+            block[ccnt < min_periods] = np.nan
+            out[:, cols] = block
+
+        return out
+
+
+'''
+# Example
+if __name__ == "__main__":
+    from gsodscrapper import GSOD
+    gsod = GSOD(state='IA', start='2015-01-01')
+    stns = gsod.getAvailableWxStations().STATION_ID.tolist()
+    wx = WeatherIndicators.from_gsod(gsod.get_bulk_data(stns, 2015, 2020))
+    planting = pd.Series(pd.Timestamp('2020-05-01'), index=wx.stations)
+    print(wx.frame(wx.gdd(cumulative=True, start=planting)).tail())
+    print(wx.frame(wx.anomaly('mean_tmp', window=30)).tail())
+'''
@@ -1,8 +1,14 @@
 # """ gsodscrapper.py """
 
-import requests, os, re, gzip, folium, sys
+import requests, os, re, gzip, zlib, folium, sys, threading, json, hashlib, time
+import numpy as np
 import pandas as pd
 import datetime as dt
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 sys.path.append('.../factory/') # Work
 
@@ -12,12 +18,406 @@ variables = variables.Variables.get_variables()
 
 TMP = variables['path_temp']
 
+GSOD_URL = 'https://www1.ncdc.noaa.gov/pub/data/gsod/'
+
+# NOAA keeps adding late reports to a year's files after the year ends. A year's
+# file (and folder listing) is only final once fetched this long after Dec 31
+GSOD_PUBLICATION_LAG = dt.timedelta(days=30)
+
+
+# Raised by gzip.decompress on a truncated or corrupt payload
+_GZIP_ERRORS = (OSError, EOFError, zlib.error)
+
+
+def _yearFinalAt(year):
+    # Epoch time from which a download of 'year' is final
+    return time.mktime((dt.datetime(int(year) + 1, 1, 1) + GSOD_PUBLICATION_LAG).timetuple())
+
+# Fixed-width layout of the GSOD .op records (0-based, end exclusive).
+# kind: 'id' station id part, 'date' YYYYMMDD, 'num' measure, 'cnt' observation count,
+# 'tflag' max/min temperature flag, 'flag' one-character flag
+_GSOD_FIELDS = [('stn', 0, 6, 'id'),
+                ('wban', 7, 12, 'id'),
+                ('timestamp', 14, 22, 'date'),
+                ('mean_tmp', 25, 30, 'num'),
+                ('mean_tmp_f', 31, 33, 'cnt'),
+                ('dew_point', 36, 41, 'num'),
+                ('dew_point_f', 42, 44, 'cnt'),
+                ('mean_sea_level_press', 46, 52, 'num'),     # Mean sea level pressure
+                ('mean_sea_level_press_f', 53, 55, 'cnt'),
+                ('mean_stn_pressure', 57, 63, 'num'),        # Mean station pressure
+                ('mean_stn_pressure_f', 64, 66, 'cnt'),
+                ('visib', 68, 73, 'num'),
+                ('visib_f', 74, 76, 'cnt'),
+                ('mean_wind_speed', 78, 83, 'num'),
+                ('mean_wind_speed_f', 84, 86, 'cnt'),
+                ('max_wind_speed', 88, 93, 'num'),
+                ('max_gust_speed', 95, 100, 'num'),
+                ('max_tmp', 103, 108, 'num'),
+                ('max_tmp_f', 108, 109, 'tflag'),
+                ('min_tmp', 111, 116, 'num'),
+                ('min_tmp_f', 116, 117, 'tflag'),
+                ('prcp', 118, 123, 'num'),
+                ('prcp_f', 123, 124, 'flag'),
+                ('snow_depth', 125, 130, 'num'),             # Snow depth in inches to tenth
+                ('fog_f', 132, 133, 'flag'),                 # Fog
+                ('rain_or_drizzle_f', 133, 134, 'flag'),     # Rain or drizzle
+                ('snow_or_ice_pellets_f', 134, 135, 'flag'), # Snow or ice pallet
+                ('hail_f', 135, 136, 'flag'),                # Hail
+                ('thunder_f', 136, 137, 'flag'),             # Thunder
+                ('tornado_f', 137, 138, 'flag')]             # Tornado or funnel cloud
+_GSOD_LINE_WIDTH = 138
+
+# Sentinels NOAA uses for missing measures
+_GSOD_MISSING = [99.99, 99.9, 999.9, 9999.9]
+
+
+# Wide GSOD columns kept as identifiers in the unpivoted SQL table
+_SQL_ID_COLUMNS = {'ctry' : 'country',
+                   'state' : 'state',
+                   'station_id' : 'station_id',
+                   'station_name' : 'station_name',
+                   'lat' : 'latitude',
+                   'lon' : 'longitude',
+                   'timestamp' : 'timestamp',
+                   'begin' : 'start_date',
+                   'end' : 'end_date'} # At max will be 2 or 3 days before the date data were downloaded from NOAA servers
+_SQL_TYPES = {'latitude' : 'REAL', 'longitude' : 'REAL', 'value' : 'REAL'}
+
+# Station master loaded once per process: binary file path -> (mtime, ISDStations)
+_ISD_MEMO = {}
+
+
+class ISDStations(object):
+    '''
+    In-memory ISD station master with hash indexes by STATION_ID, CTRY and STATE so
+    that per-station metadata and country/state selections don't scan the frame
+    '''
+
+    def __init__(self, df):
+        self.df = df
+        # Station ids are not unique in isd-history (e.g. 999999-99999): keep the first row
+        ids = df.STATION_ID.tolist()
+        self.by_id = dict(zip(ids[::-1], range(len(ids) - 1, -1, -1)))
+        self.by_ctry = df.groupby('CTRY', observed=True).indices
+        self.by_state = df.groupby('STATE', observed=True).indices
+
+    def station(self, stn_id):
+        '''
+        Metadata row of a station as a pd.Series, None if unknown
+        '''
+        pos = self.by_id.get(stn_id)
+        if pos is None:
+            return None
+        return self.df.iloc[pos]
+
+    def select(self, ctry=None, state=None):
+        '''
+        Stations in any of the given countries and/or states
+        '''
+        pos = []
+        for keys, table in ((ctry, self.by_ctry), (state, self.by_state)):
+            for key in keys or []:
+                pos.append(table.get(key, np.array([], dtype=np.intp)))
+        if not pos:
+            return self.df.iloc[:0]
+        return self.df.iloc[np.unique(np.concatenate(pos))]
+
+    def spatial(self):
+        '''
+        StationSpatialIndex over this station master, built on first use
+        '''
+        if getattr(self, '_spatial', None) is None:
+            self._spatial = StationSpatialIndex(self.df)
+        return self._spatial
+
+
+_EARTH_RADIUS_KM = 6371.0088
+_KM_PER_DEG = np.pi * _EARTH_RADIUS_KM / 180
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    # Great-circle distance in km, inputs in degrees (scalars or arrays)
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return 2 * _EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class StationSpatialIndex(object):
+    '''
+    Grid index over station coordinates (LAT/LON columns of an isd-history like frame).
+    Stations are bucketed in cell_deg x cell_deg cells sorted by cell id, so a query
+    only computes exact distances for stations in the few cells its bounding box
+    touches. Supports radius, k-nearest, bounding-box and polygon queries
+    '''
+
+    def __init__(self, df, cell_deg=1.0):
+        ok = (df.LAT.between(-90, 90) & df.LON.between(-180, 180)).values
+        self.df = df[ok].reset_index(drop=True)
+        self.lat = self.df.LAT.to_numpy(dtype=float)
+        self.lon = self.df.LON.to_numpy(dtype=float)
+
+        self.cell_deg = cell_deg
+        self.n_rows = int(np.ceil(180 / cell_deg))
+        self.n_cols = int(np.ceil(360 / cell_deg))
+
+        cells = self._row(self.lat) * self.n_cols + self._col(self.lon)
+        self.order = np.argsort(cells, kind='stable')
+        self.cells = cells[self.order]
+
+    def _row(self, lat):
+        return np.clip(np.floor((np.asarray(lat) + 90) / self.cell_deg).astype(int), 0, self.n_rows - 1)
+
+    def _col(self, lon):
+        return np.clip(np.floor(((np.asarray(lon) + 180) % 360) / self.cell_deg).astype(int), 0, self.n_cols - 1)
+
+    def _candidates(self, lat_min, lat_max, lon_min, lon_max):
+        # Positions of the stations in the cells covering the box; lon_min > lon_max
+        # means the box crosses the antimeridian
+        rows = np.arange(self._row(max(lat_min, -90)), self._row(min(lat_max, 90)) + 1)
+        if lon_max - lon_min >= 360:
+            spans = [(0, self.n_cols - 1)]
+        else:
+            c0, c1 = int(self._col(lon_min)), int(self._col(lon_max))
+            wrapped = (lon_min + 180) % 360 > (lon_max + 180) % 360
+            spans = [(c0, self.n_cols - 1), (0, c1)] if wrapped else [(c0, c1)]
+
+        pos = []
+        for c0, c1 in spans:
+            lo = np.searchsorted(self.cells, rows * self.n_cols + c0, side='left')
+            hi = np.searchsorted(self.cells, rows * self.n_cols + c1, side='right')
+            pos.extend(self.order[i:j] for i, j in zip(lo, hi) if j > i)
+        return np.concatenate(pos) if pos else np.array([], dtype=np.intp)
+
+    def radius(self, lat, lon, km):
+        '''
+        Stations within 'km' of (lat, lon), closest first, with a DIST_KM column
+        '''
+        dlat = km / _KM_PER_DEG
+        lat_min, lat_max = lat - dlat, lat + dlat
+        widest = max(abs(lat_min), abs(lat_max))
+        if widest >= 90 or dlat / np.cos(np.radians(widest)) >= 180:
+            pos = self._candidates(lat_min, lat_max, -180, 180)
+        else:
+            dlon = dlat / np.cos(np.radians(widest))
+            pos = self._candidates(lat_min, lat_max, lon - dlon, lon + dlon)
+
+        dist = _haversine(lat, lon, self.lat[pos], self.lon[pos])
+        keep = dist <= km
+        pos, dist = pos[keep], dist[keep]
+        rank = np.argsort(dist, kind='stable')
+
+        df = self.df.iloc[pos[rank]].copy()
+        df['DIST_KM'] = dist[rank]
+        return df
+
+    def nearest(self, lat, lon, k=1):
+        '''
+        The k stations closest to (lat, lon), with a DIST_KM column
+        '''
+        km = 4 * self.cell_deg * _KM_PER_DEG
+        while True:
+            df = self.radius(lat, lon, km)
+            if len(df) >= k or km >= np.pi * _EARTH_RADIUS_KM:
+                return df.head(k)
+            km *= 2
+
+    def bbox(self, lat_min, lat_max, lon_min, lon_max):
+        '''
+        Stations inside a lat/lon box, lon_min > lon_max for boxes across the antimeridian
+        '''
+        pos = self._candidates(lat_min, lat_max, lon_min, lon_max)
+        lat, lon = self.lat[pos], self.lon[pos]
+        in_lon = (lon >= lon_min) & (lon <= lon_max) if lon_min <= lon_max else (lon >= lon_min) | (lon <= lon_max)
+        return self.df.iloc[np.sort(pos[(lat >= lat_min) & (lat <= lat_max) & in_lon])]
+
+    def polygon(self, coords):
+        '''
+        Stations inside a polygon given as a sequence of (lat, lon) vertices
+        (even-odd rule, vectorized over the candidate stations)
+        '''
+        poly = np.asarray(coords, dtype=float)
+        pos = self._candidates(poly[:, 0].min(), poly[:, 0].max(), poly[:, 1].min(), poly[:, 1].max())
+        py, px = self.lat[pos], self.lon[pos]
+
+        inside = np.zeros(len(pos), dtype=bool)
+        for (y1, x1), (y2, x2) in zip(poly, np.roll(poly, -1, axis=0)):
+            crosses = (y1 > py) != (y2 > py)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_cut = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+            inside ^= crosses & (px < x_cut)
+
+        return self.df.iloc[np.sort(pos[inside])]
+
+
+class GSODCache(object):
+    '''
+    On-disk cache of the yearly {station}-{year}.op.gz files. Payloads are stored once
+    under their sha256 digest in 'blobs' and an 'index.json' maps station/year to
+    digest, size, ETag/Last-Modified, fetch time and last access time
+
+    A year is closed once its file was fetched (or revalidated) after the year ended
+    plus GSOD_PUBLICATION_LAG; closed entries are served straight from disk, all
+    others are revalidated with a conditional GET. When the total size of the blobs
+    exceeds max_bytes, the least recently used entries are evicted
+    '''
+
+    def __init__(self, path, max_bytes=2 * 1024**3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(path, 'blobs')
+        self.file_index = os.path.join(path, 'index.json')
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+        try:
+            with open(self.file_index) as f:
+                self.index = json.load(f)
+        except (IOError, ValueError):
+            self.index = {}
+
+        # Budget may have shrunk since the last run
+        with self._lock:
+            self._evict()
+
+    @staticmethod
+    def key(station, year):
+        return '{}-{}'.format(station, year)
+
+    def _blob(self, digest):
+        return os.path.join(self.blob_dir, digest + '.op.gz')
+
+    def _save_index(self):
+        tmp = self.file_index + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.file_index)
+
+    def lookup(self, station, year):
+        '''
+        Return (entry, content) for a cached station/year, (None, None) if unknown
+        '''
+        with self._lock:
+            entry = self.index.get(self.key(station, year))
+        if entry is None:
+            return None, None
+        try:
+            with open(self._blob(entry['sha256']), 'rb') as f:
+                return entry, f.read()
+        except IOError:
+            with self._lock:
+                self.index.pop(self.key(station, year), None)
+            return None, None
+
+    def store(self, station, year, content, etag=None, last_modified=None):
+        digest = hashlib.sha256(content).hexdigest()
+        blob = self._blob(digest)
+        if not os.path.exists(blob):
+            tmp = blob + '.{}.tmp'.format(threading.get_ident())
+            with open(tmp, 'wb') as f:
+                f.write(content)
+            os.replace(tmp, blob)
+
+        with self._lock:
+            now = time.time()
+            self.index[self.key(station, year)] = {'sha256' : digest,
+                                                   'size' : len(content),
+                                                   'etag' : etag,
+                                                   'last_modified' : last_modified,
+                                                   'fetched_at' : now,
+                                                   'last_access' : now}
+            self._evict()
+            self._save_index()
+
+    def evict(self, station, year):
+        '''
+        Drop a station/year entry, and its blob unless another entry shares it
+        '''
+        with self._lock:
+            entry = self.index.pop(self.key(station, year), None)
+            if entry is None:
+                return
+            if not any(e['sha256'] == entry['sha256'] for e in self.index.values()):
+                try:
+                    os.remove(self._blob(entry['sha256']))
+                except OSError:
+                    pass
+            self._save_index()
+
+    def touch(self, station, year, hit=True, revalidated=False):
+        with self._lock:
+            entry = self.index.get(self.key(station, year))
+            if entry is not None:
+                entry['last_access'] = time.time()
+            if revalidated:
+                self.revalidated += 1
+                if entry is not None:
+                    # NOAA confirmed the payload is current as of now
+                    entry['fetched_at'] = entry['last_access']
+                    self._save_index()
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @staticmethod
+    def is_closed(entry, year):
+        '''
+        True if the cached file of 'year' was fetched after that year became final.
+        Entries without a fetch time (older caches) are revalidated once
+        '''
+        return entry.get('fetched_at', 0) >= _yearFinalAt(year)
+
+    def total_bytes(self):
+        # Identical payloads share one blob
+        return sum({e['sha256'] : e['size'] for e in self.index.values()}.values())
+
+    def _evict(self):
+        # Caller holds the lock
+        if self.max_bytes is None:
+            return
+        refs = Counter(e['sha256'] for e in self.index.values())
+        total = self.total_bytes()
+        for key, entry in sorted(self.index.items(), key=lambda kv: kv[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            del self.index[key]
+            refs[entry['sha256']] -= 1
+            if refs[entry['sha256']] == 0:
+                total -= entry['size']
+                try:
+                    os.remove(self._blob(entry['sha256']))
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            return {'hits' : self.hits,
+                    'misses' : self.misses,
+                    'revalidated' : self.revalidated,
+                    'entries' : len(self.index),
+                    'bytes' : self.total_bytes()}
+
+
 class GSOD(object):
 
-    def __init__(self, wx_list_flag=False, country=None, state=None, start=None, end=None):
+    def __init__(self, wx_list_flag=False, country=None, state=None, start=None, end=None,
+                 cache=True, cache_max_bytes=2 * 1024**3):
 
         # It is assume that NOAA doesn't rename the isd-historycsv file
         self.file_csv = os.path.join(TMP, 'isd-history.csv')
+        # Typed columnar copy of the csv, parquet when pyarrow is available
+        self.file_bin = os.path.join(TMP, 'isd-history.parquet')
+
+        # High-water marks of the incremental refresh
+        self.file_state = os.path.join(TMP, 'gsod_state.json')
+
+        # Local copy of the yearly .op.gz files
+        self.cache = GSODCache(os.path.join(TMP, 'gsod_cache'), cache_max_bytes) if cache else None
 
         self.wx_list_flag = wx_list_flag
 
@@ -51,6 +451,49 @@ class GSOD(object):
 
     def _ISDwXstationSlist(self):
         # iT is a factory function
+        return self._stationIndex().df
+
+    def _stationIndex(self):
+        '''
+        ISD station master as an ISDStations object, memoized per process. The csv is
+        parsed once and saved as a typed binary file (categorical CTRY/STATE, parsed
+        BEGIN/END dates) that later runs load directly
+        '''
+        if not self.wx_list_flag:
+            for path in (self.file_bin, self.file_bin.replace('.parquet', '.pkl')):
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    continue
+                if os.path.exists(self.file_csv) and os.path.getmtime(self.file_csv) > mtime:
+                    continue
+                memo = _ISD_MEMO.get(path)
+                if memo is None or memo[0] != mtime:
+                    df_isd = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_pickle(path)
+                    memo = (mtime, ISDStations(df_isd))
+                    _ISD_MEMO[path] = memo
+                return memo[1]
+
+        df_isd = self._readISDcsv()
+        if df_isd is None:
+            return None
+
+        for key in ('CTRY', 'STATE'):
+            df_isd[key] = df_isd[key].astype('category')
+        df_isd = df_isd.reset_index(drop=True)
+
+        try:
+            df_isd.to_parquet(self.file_bin, index=False)
+            path = self.file_bin
+        except ImportError:
+            path = self.file_bin.replace('.parquet', '.pkl')
+            df_isd.to_pickle(path)
+
+        memo = (os.path.getmtime(path), ISDStations(df_isd))
+        _ISD_MEMO[path] = memo
+        return memo[1]
+
+    def _readISDcsv(self):
 
         df_mapping = {'USAF' : str,
                         'WBAN' : str,
@@ -109,7 +552,7 @@ class GSOD(object):
             except IOError as err:
                 print('Cannot find isd-history.csv on the disk...')
                 self.wx_list_flag = True
-                self._ISDwXstationSlist()
+                return self._readISDcsv()
 
     def getAvailableWxStations(self):
         '''
@@ -122,56 +565,103 @@ class GSOD(object):
             print('''Requires at least 'country' or 'state' keyword argument!\n''')
             raise Exception()
 
-        df_isd = self._ISDwXstationSlist()
+        stations = self._stationIndex()
+        df_isd = stations.df
 
         if self.ctry:
-            #df_sliced = df_isd[df_isd.CTRY.isin(self.ctry)]
-
-            df_sliced = df_isd[(df_isd.CTRY.isin(self.ctry)) & (df_isd.BEGIN <= self.start) & 
-                (df_isd.END >= self.end)]
+            df_sliced = stations.select(ctry=self.ctry)
 
         if self.sta:
-            #df_sliced = df_isd[df_isd.STATE.isin(self.sta)]
-            df_sliced = df_isd[(df_isd.STATE.isin(self.sta)) & (df_isd.BEGIN <= self.start) & 
-                (df_isd.END >= self.end)]
+            df_sliced = stations.select(state=self.sta)
+
+        df_sliced = df_sliced[(df_sliced.BEGIN <= self.start) & (df_sliced.END >= self.end)]
 
         # Level 2 selection: get through the folders on  NOAA servers for each year from
         # the year of 'start' parameter to 'end'
 
-        start_year = self.start.year
-        end_year = self.end.year
-        list_stns = df_sliced.STATION_ID
-        #print(list_stns)
-        df_avail = pd.DataFrame()
+        df_avail = self.getAvailabilityTable(df_sliced.STATION_ID, self.start.year, self.end.year)
+        list_stns_avail = df_avail.index[df_avail.all(axis=1)]
 
-        for y in range(start_year, end_year+1):
-            #print(y)
-            url = os.path.join('https://www1.ncdc.noaa.gov/pub/data/gsod/', str(y))
-            #print(url)
-            req = requests.get(url)
-            acc= []
-            for stn in list_stns:
-                if bool(re.search(stn, req.text)):
-                    acc.append(1)
-                else:
-                    acc.append(pd.np.nan)
+        return df_isd[df_isd.STATION_ID.isin(list_stns_avail)].reset_index(drop=True)
+
+
+    def _yearListing(self, year):
+        '''
+        Set of station ids having a file in the NOAA folder of a given year. The
+        directory listing is downloaded and parsed once, then kept in memory and in
+        a per-year index file. An index saved after the year became final (see
+        GSOD_PUBLICATION_LAG) is never fetched again, any other is refreshed once a day
+        '''
+        if not hasattr(self, '_listings'):
+            self._listings = {}
+        year = int(year)
+        if year in self._listings:
+            return self._listings[year]
+
+        # v2: listings written before station ids with letters were matched are stale
+        path_dir = os.path.join(TMP, 'gsod_listings_v2')
+        file_idx = os.path.join(path_dir, '{}.txt'.format(year))
+        fresh = False
+        if os.path.exists(file_idx):
+            mtime = os.path.getmtime(file_idx)
+            fresh = mtime >= _yearFinalAt(year) or time.time() - mtime < 86400
+        if fresh:
+            with open(file_idx) as f:
+                listing = set(f.read().split())
+        else:
+            req = self._session().get(GSOD_URL + str(year) + '/', timeout=60)
+            req.raise_for_status()
+            listing = set(re.findall(r'([0-9A-Z]{6}-\d{5})-' + str(year) + r'\.op\.gz', req.text))
+            os.makedirs(path_dir, exist_ok=True)
+            with open(file_idx, 'w') as f:
+                f.write('\n'.join(sorted(listing)))
 
-            df_tmp = pd.DataFrame({ y : acc}, index=list_stns)
+        self._listings[year] = listing
+        return listing
 
-            df_avail =pd.concat([df_avail, df_tmp], axis=1)
-    
-        list_stns_avail = df_avail.dropna(axis=0, how='any').index.tolist()
+    def getAvailabilityTable(self, stations, start_year, end_year):
+        '''
+        Boolean table (station x year) telling whether NOAA has a file for each
+        station and year. Availability is a set lookup per year, vectorized over
+        all stations with isin()
+        '''
+        stations = pd.Index(stations, name='STATION_ID')
+        years = list(range(start_year, end_year+1))
 
+        with ThreadPoolExecutor(max_workers=min(8, len(years)) or 1) as pool:
+            listings = list(pool.map(self._yearListing, years))
 
-        return df_isd[df_isd.STATION_ID.isin(list_stns_avail)].reset_index(drop=True)
+        return pd.DataFrame({y : stations.isin(l) for y, l in zip(years, listings)}, index=stations)
 
+    def spatialIndex(self):
+        '''
+        Spatial index over all ISD weather stations (built once per process), e.g.
+            gsod.spatialIndex().radius(41.6, -93.6, 150)
+            gsod.spatialIndex().nearest(41.6, -93.6, k=10)
+            gsod.spatialIndex().bbox(40, 44, -97, -90)
+            gsod.spatialIndex().polygon([(43.5, -96.6), (43.5, -91.2), (40.4, -91.4), (40.6, -95.8)])
+        '''
+        return self._stationIndex().spatial()
 
     @staticmethod
-    def plotWxStations(df):
+    def plotWxStations(df, center=None, radius_km=None, index=None):
         '''
         Plot weather stations on a map (inside a notebook). Input parameter 'df'
         is a pandas.dataFrame() similar to the one out of the getAvailableWxStations() function
+        or of a spatialIndex() query. With center=(lat, lon) and radius_km only the stations
+        around that point are plotted
+
+        The radius query runs on 'index' (e.g. gsod.spatialIndex()), by default the
+        spatial index of the station master already loaded in this process; an index
+        over 'df' is only built when no station master was loaded
         '''
+        if center is not None and radius_km is not None:
+            if index is None:
+                loaded = [memo[1] for memo in _ISD_MEMO.values()]
+                index = loaded[-1].spatial() if loaded else StationSpatialIndex(df)
+            near = index.radius(center[0], center[1], radius_km)
+            df = df[df.STATION_ID.isin(near.STATION_ID)]
+
         mid_lat = df.LAT.mean()
         mid_lon = df.LON.mean()
         map_ = folium.Map(location=[mid_lat, mid_lon],
@@ -187,137 +677,262 @@ class GSOD(object):
         return map_
 
 
+    def _session(self, pool_size=16, retries=5, backoff=0.5):
+        '''
+        Shared requests.Session with a connection pool sized for the bulk downloader,
+        retrying connection errors and throttling/server errors with exponential backoff
+        '''
+        if getattr(self, 'session', None) is None:
+            retry = Retry(total=retries,
+                          backoff_factor=backoff,
+                          status_forcelist=(429, 500, 502, 503, 504),
+                          allowed_methods=('GET', 'HEAD'))
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            self.session = requests.Session()
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+            self._host_slots = {}
+            self._host_limit = pool_size
+        return self.session
+
+    def _fetchOpFile(self, station, year, timeout=60, retries=1):
+        '''
+        Download one {station}-{year}.op.gz file and return it decompressed. The
+        number of requests in flight per host is capped by a semaphore so worker
+        threads don't hammer NOAA
+
+        With the cache on, closed years (see GSODCache.is_closed) are read from disk;
+        anything else is only transferred again when NOAA reports a new
+        ETag/Last-Modified. Payloads are decompressed before they are cached: a
+        corrupt or truncated cached file is evicted and downloaded again, a corrupt
+        download is retried 'retries' times and then raises (OSError, EOFError or
+        zlib.error)
+        '''
+        entry, cached, raw = (None, None, None)
+        if self.cache is not None:
+            entry, cached = self.cache.lookup(station, year)
+            if cached is not None:
+                try:
+                    raw = gzip.decompress(cached)
+                except _GZIP_ERRORS:
+                    print('Evicting corrupt cache entry {}-{}'.format(station, year))
+                    self.cache.evict(station, year)
+                    entry, cached = (None, None)
+            if cached is not None and self.cache.is_closed(entry, year):
+                self.cache.touch(station, year, hit=True)
+                return raw
+
+        url = GSOD_URL + str(year) + '/' + str(station) + '-' + str(year) + '.op.gz'
+        sess = self._session()
+
+        headers = {}
+        if cached is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        host = urlparse(url).netloc
+        slot = self._host_slots.setdefault(host, threading.BoundedSemaphore(self._host_limit))
+        for attempt in range(retries + 1):
+            with slot:
+                stream = sess.get(url, headers=headers, timeout=timeout)
+
+            if stream.status_code == 304 and cached is not None:
+                self.cache.touch(station, year, hit=True, revalidated=True)
+                return raw
+            stream.raise_for_status()
+
+            try:
+                raw = gzip.decompress(stream.content)
+                break
+            except _GZIP_ERRORS:
+                if attempt == retries:
+                    raise
+                print('Corrupt download {}-{}, retrying'.format(station, year))
+
+        if self.cache is not None:
+            self.cache.touch(station, year, hit=False)
+            self.cache.store(station, year, stream.content,
+                             etag=stream.headers.get('ETag'),
+                             last_modified=stream.headers.get('Last-Modified'))
+
+        return raw
+
+    def get_bulk_data(self, stations, start_year=None, end_year=None, max_workers=8, per_host=4):
+        '''
+        Get weather data for many stations and years at once. All {station}-{year}.op.gz
+        files are fetched through a bounded thread pool sharing one pooled session,
+        each file is parsed as soon as it lands, and the frames are concatenated once
+
+        Station-years missing on NOAA servers are reported and skipped. Years default
+        to the current one
+        '''
+        if isinstance(stations, str):
+            stations = stations.split()
+        now_year = dt.datetime.now().year
+        start_year = now_year if start_year is None else start_year
+        end_year = now_year if end_year is None else end_year
+
+        self._session(pool_size=max(max_workers, per_host))
+        self._host_slots = {}
+        self._host_limit = per_host
+
+        jobs = [(stn, year) for stn in stations for year in range(start_year, end_year+1)]
+
+        def job(args):
+            stn, year = args
+            try:
+                return self._parseGSODBuffer(self._fetchOpFile(stn, year))
+            except (requests.exceptions.RequestException,) + _GZIP_ERRORS as err:
+                print('Skipping {}-{}: {}'.format(stn, year, err))
+                return None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            frames = [df for df in pool.map(job, jobs) if df is not None and not df.empty]
+
+        if not frames:
+            return pd.DataFrame()
+
+        big_df = pd.concat(frames, ignore_index=True)
+
+        return self._dataCleanerConverter(self._addStationInfo(big_df))
+
+    def _addStationInfo(self, big_df):
+        # Add weather station information to the dataframe, one merge for all stations
+        df_isd = self._ISDwXstationSlist()
+        df_info = df_isd[['STATION_ID', 'CTRY', 'STATE', 'STATION_NAME', 'LAT', 'LON', 'ELEV', 'BEGIN', 'END']]
+        df_info = df_info.drop_duplicates(subset='STATION_ID').rename(columns={'ELEV' : 'ELEVATION'})
+        big_df = big_df.merge(df_info, on='STATION_ID', how='left')
+
+        big_df.columns = map(str.lower, big_df.columns)
+
+        return big_df
+
+    def _loadState(self):
+        # Per-station high-water marks of the incremental refresh
+        try:
+            with open(self.file_state) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    @staticmethod
+    def _markYears(mark):
+        # {year: records read} of a high-water mark. Marks written before per-year
+        # checkpoints hold a single 'year' and 'lines'
+        if 'years' in mark:
+            return {int(y) : int(n) for y, n in mark['years'].items()}
+        if 'year' in mark:
+            return {int(mark['year']) : int(mark.get('lines', 0))}
+        return {}
+
+    def _saveState(self, state):
+        tmp = self.file_state + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.file_state)
+
+    def get_new_data(self, stations, end_year=None, max_workers=8, commit=True):
+        '''
+        Incremental refresh: return only the rows not yet emitted for each station.
+        High-water marks are kept in path_temp/gsod_state.json: the last date emitted
+        and, per year file, the number of records already read from it; records
+        before the checkpoint are skipped by byte offset, so the cost is
+        proportional to the number of new days. Year files come from the local cache
+
+        A year stays in the marks (and is re-read from its checkpoint) until its file
+        was read after the year became final (see GSOD_PUBLICATION_LAG), so reports
+        NOAA adds to last year's file after Jan 1 are still picked up
+
+        A station seen for the first time is read from January 1st of 'end_year'
+        (the current year if None). With commit=False the high-water marks are left
+        untouched (dry run)
+        '''
+        if isinstance(stations, str):
+            stations = stations.split()
+        if end_year is None:
+            end_year = dt.datetime.now().year
+
+        state = self._loadState()
+        self._session(pool_size=max_workers)
+
+        def job(stn):
+            mark = state.get(stn, {})
+            read = self._markYears(mark)
+            first_year = min(read) if read else end_year
+            frames, last_date = [], mark.get('last_date')
+
+            for year in range(first_year, end_year+1):
+                skip = read.get(year, 0)
+                try:
+                    raw = self._fetchOpFile(stn, year)
+                except (requests.exceptions.RequestException,) + _GZIP_ERRORS as err:
+                    print('Skipping {}-{}: {}'.format(stn, year, err))
+                    continue
+
+                df = self._parseGSODBuffer(raw, skip_lines=skip)
+                read[year] = skip + len(df)
+                if not df.empty:
+                    day = str(df.timestamp.max().date())
+                    last_date = day if last_date is None else max(last_date, day)
+                    frames.append(df)
+
+            # Years read once final are settled; keep the others and the latest one
+            now = time.time()
+            latest = max(read) if read else None
+            years = {str(y) : n for y, n in sorted(read.items()) if y == latest or now < _yearFinalAt(y)}
+            new_mark = {'last_date' : last_date, 'years' : years} if years else {}
+            return stn, frames, new_mark
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(job, stations))
+
+        frames = [df for _, dfs, _ in results for df in dfs]
+        if commit:
+            state.update({stn : mark for stn, _, mark in results if mark})
+            self._saveState(state)
+
+        if not frames:
+            return pd.DataFrame()
+
+        big_df = pd.concat(frames, ignore_index=True)
+
+        return self._dataCleanerConverter(self._addStationInfo(big_df))
+
     def get_data(self, station=None, start_year=dt.datetime.now().year, end_year=dt.datetime.now().year, **kwargs):
         '''
         Get weather data from the internet as memory stream
         '''
-        big_df = pd.DataFrame()
+        frames = []
 
         for year in range(start_year, end_year+1):
 
-            # Define URL
-            url = 'http://www1.ncdc.noaa.gov/pub/data/gsod/' + str(year) + '/' + str(station) \
-                + '-' + str(year) + '.op.gz'
-
-            # Define data stream
-            stream = requests.get(url)
-
-            # Unzip on-the-fly
-            decomp_bytes = gzip.decompress(stream.content)
-            data = decomp_bytes.decode('utf-8').split('\n')
-
-            # Remove start and end elements
-            data.pop(0) # Remove first line header
-            data.pop()  # Remove last element
-
-            # Define lists
-            (stn, wban, date, mean_tmp, mean_tmp_f, dew_point, dew_point_f,
-             mean_sea_level_press, mean_sea_level_press_f, mean_stn_pressure, mean_stn_pressure_f, visib, visib_f,
-             mean_wind_speed, mean_wind_speed_f, max_wind_speed, max_gust_speed, max_tmp, max_tmp_f, min_tmp, min_tmp_f,
-             prcp, prcp_f, snow_depth, fog_f, rain_or_drizzle_f, snow_or_ice_pellets_f, hail_f, thunder_f, tornado_f) = ([] for i in range(30))
-
-            # Fill in lists
-            for i in range(0, len(data)):
-                stn.append(data[i][0:6])
-                wban.append(data[i][7:12])
-                date.append(data[i][14:22])         
-                mean_tmp.append(data[i][25:30])
-                mean_tmp_f.append(data[i][31:33])
-                dew_point.append(data[i][36:41])
-                dew_point_f.append(data[i][42:44])
-                mean_sea_level_press.append(data[i][46:52])      # Mean sea level pressure
-                mean_sea_level_press_f.append(data[i][53:55])
-                mean_stn_pressure.append(data[i][57:63])      # Mean station pressure
-                mean_stn_pressure_f.append(data[i][64:66])
-                visib.append(data[i][68:73])
-                visib_f.append(data[i][74:76])
-                mean_wind_speed.append(data[i][78:83])
-                mean_wind_speed_f.append(data[i][84:86])
-                max_wind_speed.append(data[i][88:93])
-                max_gust_speed.append(data[i][95:100])
-                max_tmp.append(data[i][103:108])
-                max_tmp_f.append(data[i][108])
-                min_tmp.append(data[i][111:116])
-                min_tmp_f.append(data[i][116])
-                prcp.append(data[i][118:123])
-                prcp_f.append(data[i][123])
-                snow_depth.append(data[i][125:130])   # Snow depth in inches to tenth
-                fog_f.append(data[i][132])          # Fog
-                rain_or_drizzle_f.append(data[i][133])          # Rain or drizzle
-                snow_or_ice_pellets_f.append(data[i][134])          # Snow or ice pallet
-                hail_f.append(data[i][135])          # Hail
-                thunder_f.append(data[i][136])         # Thunder
-                tornado_f.append(data[i][137])         # Tornado or funnel cloud
-
-            '''
-            Replacements
-            min_tmp_f & max_tmp_f
-            blank   : explicit => e
-            *       : derived => d
-            '''
-            max_tmp_f = [re.sub(pattern=' ', repl='e', string=x) for x in max_tmp_f] # List comprenhension
-            max_tmp_f = [re.sub(pattern='\*', repl='d', string=x) for x in max_tmp_f]
-
-            min_tmp_f = [re.sub(pattern=' ', repl='e', string=x) for x in min_tmp_f]
-            min_tmp_f = [re.sub(pattern='\*', repl='d', string=x) for x in min_tmp_f]
-
-            # Create intermediate matrix
-            mat = pd.np.matrix(data=[stn, wban, date, mean_tmp, mean_tmp_f, dew_point, dew_point_f,
-                   mean_sea_level_press, mean_sea_level_press_f, mean_stn_pressure, mean_stn_pressure_f, visib, visib_f,
-                   mean_wind_speed, mean_wind_speed_f, max_wind_speed, max_gust_speed, max_tmp, max_tmp_f, min_tmp, min_tmp_f,
-                   prcp, prcp_f, snow_depth, fog_f, rain_or_drizzle_f, snow_or_ice_pellets_f, hail_f, thunder_f, tornado_f]).T
-
-            # Define header names
-            headers = ['stn', 'wban', 'timestamp', 'mean_tmp', 'mean_tmp_f', 'dew_point', 'dew_point_f', 'mean_sea_level_press',
-                        'mean_sea_level_press_f', 'mean_stn_pressure', 'mean_stn_pressure_f', 'visib', 'visib_f', 'mean_wind_speed',
-                        'mean_wind_speed_f', 'max_wind_speed', 'max_gust_speed', 'max_tmp', 'max_tmp_f', 'min_tmp', 'min_tmp_f',
-                        'prcp', 'prcp_f', 'snow_depth', 'fog_f', 'rain_or_drizzle_f', 'snow_or_ice_pellets_f', 'hail_f', 'thunder_f', 'tornado_f']
-
-            # Set precision
-            pd.set_option('precision', 3)
-
-            # Create dataframe from matrix object
-            df = pd.DataFrame(data=mat, columns=headers)
-
-            # Replace missing values with NAs
-            df = df.where(df != ' ', 9999.9)
-
-            # Create station ids
-            df['STATION_ID'] = df['stn'].map(str) + '-' + df['wban'].map(str)
-            df = df.drop(['stn', 'wban'], axis=1)
-
-            # Convert to numeric
-            df[['mean_tmp', 'mean_tmp_f', 'dew_point', 'dew_point_f', 'mean_sea_level_press', 'mean_sea_level_press_f',
-                'mean_stn_pressure', 'mean_stn_pressure_f', 'visib', 'visib_f', 'mean_wind_speed', 'mean_wind_speed_f',
-                'max_wind_speed',  'max_gust_speed', 'max_tmp', 'min_tmp', 'prcp', 'snow_depth']] = df[['mean_tmp', 'mean_tmp_f', 'dew_point',
-                                                                       'dew_point_f', 'mean_sea_level_press', 'mean_sea_level_press_f', 'mean_stn_pressure',
-                                                                       'mean_stn_pressure_f', 'visib', 'visib_f', 'mean_wind_speed',
-                                                                       'mean_wind_speed_f', 'max_wind_speed', 'max_gust_speed', 'max_tmp',
-                                                                       'min_tmp', 'prcp', 'snow_depth']].apply(pd.to_numeric)
-            # Replace missing weather data with NaNs
-            df = df.replace(to_replace=[99.99, 99.9,999.9,9999.9], value=pd.np.nan)
-            
-            # Convert to date format
-            df['timestamp'] = pd.to_datetime(df['timestamp'], format='%Y%m%d')
+            # Define data stream, unzipped on-the-fly
+            raw = self._fetchOpFile(station, year)
+
+            # Parse the fixed-width records in one pass
+            frames.append(self._parseGSODBuffer(raw))
 
-            big_df = pd.concat([big_df, df])
+        big_df = pd.concat(frames, ignore_index=True)
 
         #print(big_df.head())
 
         # Add weather station information to the dataframe
-        df_isd = self._ISDwXstationSlist() # OK print(df_isd.head())
-                
-        stn_id = ''.join(str(x) for x in big_df.STATION_ID.head(1).values)
-        big_df['ctry'] = pd.np.repeat(df_isd.CTRY[df_isd.STATION_ID == stn_id].values, big_df.shape[0])
-
-        big_df['state'] = pd.np.repeat(df_isd.STATE[df_isd.STATION_ID == stn_id].values, big_df.shape[0])
-        big_df['station_name'] = pd.np.repeat(df_isd.STATION_NAME[df_isd.STATION_ID == stn_id].values, big_df.shape[0])
-        big_df['lat'] = pd.np.repeat(df_isd.LAT[df_isd.STATION_ID == stn_id].values, big_df.shape[0])
-        big_df['lon'] = pd.np.repeat(df_isd.LON[df_isd.STATION_ID == stn_id].values, big_df.shape[0])
+        stn_id = big_df.STATION_ID.iat[0]
+        info = self._stationIndex().station(stn_id)
+        if info is None:
+            info = pd.Series(np.nan, index=['CTRY', 'STATE', 'STATION_NAME', 'LAT', 'LON', 'ELEV', 'BEGIN', 'END'])
+
+        big_df['ctry'] = info.CTRY
+        big_df['state'] = info.STATE
+        big_df['station_name'] = info.STATION_NAME
+        big_df['lat'] = info.LAT
+        big_df['lon'] = info.LON
         # Added ELEV
-        big_df['elevation'] = pd.np.repeat(df_isd.ELEV[df_isd.STATION_ID == stn_id].values, big_df.shape[0])
-        big_df['begin'] = pd.np.repeat(df_isd.BEGIN[df_isd.STATION_ID == stn_id].values, big_df.shape[0])
-        big_df['end'] = pd.np.repeat(df_isd.END[df_isd.STATION_ID == stn_id].values, big_df.shape[0])
+        big_df['elevation'] = info.ELEV
+        big_df['begin'] = info.BEGIN
+        big_df['end'] = info.END
 
         big_df.columns = map(str.lower, big_df.columns)
 
@@ -328,6 +943,83 @@ class GSOD(object):
         return df
 
 
+    @staticmethod
+    def _parseGSODBuffer(decomp_bytes, skip_lines=0):
+        '''
+        Parse a decompressed .op file in one vectorized pass: records are laid out
+        as a 2-D byte array (one row per line) and each field of _GSOD_FIELDS is
+        sliced out as a whole column, instead of looping over lines
+
+        'skip_lines' records after the header are jumped over without being parsed
+        (by byte offset when the file is fixed-width)
+        '''
+        empty = pd.DataFrame(columns=[f[0] for f in _GSOD_FIELDS[2:]] + ['STATION_ID'])
+
+        # Remove first line header and the trailing end of file
+        body = decomp_bytes[decomp_bytes.find(b'\n') + 1:].rstrip(b'\r\n')
+        width = _GSOD_LINE_WIDTH + 1
+        if not body:
+            return empty
+
+        body = body.replace(b'\r\n', b'\n') + b'\n'
+        if skip_lines:
+            offset = width * skip_lines
+            if body[width - 1:width] == b'\n' and body[offset - 1:offset] == b'\n':
+                body = body[offset:]
+            else:
+                parts = body.split(b'\n', skip_lines)
+                body = parts[-1] if len(parts) > skip_lines else b''
+            if not body.strip():
+                return empty
+
+        if len(body) % width or body[width - 1::width].strip(b'\n'):
+            # Ragged lines (truncated or padded records): square them up first
+            body = b''.join(l[:_GSOD_LINE_WIDTH].ljust(_GSOD_LINE_WIDTH) + b'\n'
+                            for l in body.splitlines())
+
+        mat = np.frombuffer(body, dtype='S1').reshape(-1, width)
+
+        def column(start, end):
+            return np.ascontiguousarray(mat[:, start:end]).view('S{}'.format(end - start)).ravel()
+
+        def to_numeric(col, dtype):
+            try:
+                return col.astype(dtype)
+            except ValueError:
+                # Blank or garbled values are treated as missing
+                return pd.to_numeric(pd.Series(col.astype(str)), errors='coerce').values
+
+        data = {}
+        for name, start, end, kind in _GSOD_FIELDS:
+            if kind == 'id':
+                continue
+            col = column(start, end)
+            if kind == 'date':
+                data[name] = pd.to_datetime(col.astype(str), format='%Y%m%d')
+            elif kind == 'num':
+                data[name] = to_numeric(col, np.float64)
+            elif kind == 'cnt':
+                data[name] = to_numeric(col, np.int64)
+            elif kind == 'tflag':
+                # blank : explicit => e, * : derived => d
+                col = np.where(col == b' ', b'e', np.where(col == b'*', b'd', col))
+                data[name] = col.astype(str)
+            elif kind == 'flag':
+                data[name] = pd.Series(col.astype(str)).where(col != b' ')
+
+        # Create station ids from 'stn-wban', the separator column is overwritten in a copy
+        stn_id = np.array(mat[:, 0:12])
+        stn_id[:, 6] = b'-'
+
+        df = pd.DataFrame({k: v for k, v in data.items() if k not in ('stn', 'wban')})
+        df['STATION_ID'] = stn_id.view('S12').ravel().astype(str)
+
+        # Replace missing weather data with NaNs
+        num_cols = [f[0] for f in _GSOD_FIELDS if f[3] in ('num', 'cnt')]
+        df[num_cols] = df[num_cols].replace(to_replace=_GSOD_MISSING, value=np.nan)
+
+        return df
+
     def _dataCleanerConverter(self, df):
         """
 
@@ -378,28 +1070,13 @@ class GSOD(object):
     def SQLFeeder(self, df, attribute):
         if isinstance(attribute, str):
             attribute = [attribute]
-        
-        df_out = pd.DataFrame()
-        
-        for attr in attribute:
-            df_tmp = pd.DataFrame()
-            df_tmp['country'] = df.ctry
-            df_tmp['state'] = df.state
-            df_tmp['station_id'] = df.station_id
-            df_tmp['station_name'] = df.station_name
-            df_tmp['latitude'] = df.lat
-            df_tmp['longitude'] = df.lon
-
-            # TODO: adding *ELEVATION* column
-
-            df_tmp['timestamp'] = df.timestamp
-            df_tmp['start_date'] = df.begin
-            df_tmp['end_date'] = df.end # At max will be 2 or 3 days before the date data were downloaded from NOAA servers
-            df_tmp['attribute'] = attr
-            df_tmp['value'] = df[attr]
-            
-            df_out = pd.concat([df_out, df_tmp], axis=0)
 
+        # TODO: adding *ELEVATION* column
+
+        # Single melt over the id columns: one row per (station, timestamp, attribute)
+        df_out = df[list(_SQL_ID_COLUMNS) + list(attribute)].rename(columns=_SQL_ID_COLUMNS)
+        df_out = df_out.melt(id_vars=list(_SQL_ID_COLUMNS.values()), value_vars=list(attribute),
+                             var_name='attribute', value_name='value')
 
         '''
         # CAUTION!!!  the unit conversion steps have been commented in the code above!!
@@ -413,3 +1090,45 @@ class GSOD(object):
         return df_out
 
         #d = SQLFeeder(df, ['prcp', 'mean_tmp'])
+
+    def SQLFeederChunks(self, df, attribute, chunksize=500000):
+        '''
+        Generator version of SQLFeeder yielding long tables of about 'chunksize' rows,
+        so that the whole unpivoted panel never sits in memory. Rows come out by
+        blocks of wide rows, all attributes of a block before the next block
+        '''
+        if isinstance(attribute, str):
+            attribute = [attribute]
+
+        step = max(chunksize // len(attribute), 1)
+        for i in range(0, len(df), step):
+            yield self.SQLFeeder(df.iloc[i:i+step], attribute)
+
+    def SQLBulkLoad(self, df, attribute, con, table='gsod', chunksize=500000, create=True, placeholder='?'):
+        '''
+        Unpivot df and insert it chunk by chunk through a DB-API connection with
+        cursor.executemany(), committing once per chunk. 'placeholder' is the driver's
+        paramstyle marker ('?' for sqlite3/pyodbc, '%s' for psycopg2/pymysql)
+
+        Returns the number of rows inserted
+        '''
+        cols = list(_SQL_ID_COLUMNS.values()) + ['attribute', 'value']
+        cur = con.cursor()
+        if create:
+            cur.execute('CREATE TABLE IF NOT EXISTS {} ({})'.format(
+                table, ', '.join('{} {}'.format(c, _SQL_TYPES.get(c, 'TEXT')) for c in cols)))
+
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(table, ', '.join(cols), ', '.join([placeholder] * len(cols)))
+
+        n = 0
+        for chunk in self.SQLFeederChunks(df, attribute, chunksize):
+            # Dates as ISO strings and NaN/NaT as NULL so any driver accepts them
+            for c in ('timestamp', 'start_date', 'end_date'):
+                chunk[c] = pd.to_datetime(chunk[c]).dt.strftime('%Y-%m-%d')
+            chunk = chunk[cols].astype(object)
+            chunk = chunk.where(chunk.notna(), None)
+            cur.executemany(sql, chunk.itertuples(index=False, name=None))
+            con.commit()
+            n += len(chunk)
+
+        return n